@@ -2,9 +2,7 @@ from os import environ
 from logging import Logger, getLogger
 
 from flask import Flask, logging
-from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.schema import MetaData
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
@@ -31,10 +29,14 @@ from . import loggingInit
 
 APP.logger # type: Logger
 AUTH_LOGGER = getLogger('flask.app.auth')  # type: Logger
+DB_LOGGER = getLogger('flask.app.db')  # type: Logger
+
+# pylint: disable=C0413
+from .db_routing import RoutingSQLAlchemy
 
 # Setup DB with Migrations and bcrypt
-DB: SQLAlchemy
-DB = SQLAlchemy(APP, metadata=MetaData(naming_convention={
+DB: RoutingSQLAlchemy
+DB = RoutingSQLAlchemy(APP, metadata=MetaData(naming_convention={
     'pk': 'pk_%(table_name)s',
     'fk': 'fk_%(table_name)s_%(column_0_name)s',
     'ix': 'ix_%(table_name)s_%(column_0_name)s',
@@ -42,7 +44,15 @@ DB = SQLAlchemy(APP, metadata=MetaData(naming_convention={
     'ck': 'ck_%(table_name)s_%(column_0_name)s',
 }))
 
-MIGRATE: Migrate = Migrate(APP, DB)
+# Flask-Migrate imports alembic, which is only needed by the flask db commands, so WSGI servers
+# skip it. The flask command sets FLASK_RUN_FROM_CLI before it loads the app; it is checked instead
+# of sys.modules, because the flask command only imports its plugins (flask_migrate.cli) when it
+# looks up a command, which may happen after the app is loaded.
+MIGRATE = None
+if environ.get('FLASK_RUN_FROM_CLI') == 'true':
+    # pylint: disable=C0413
+    from flask_migrate import Migrate
+    MIGRATE = Migrate(APP, DB)
 
 # Setup JWT
 JWT: JWTManager = JWTManager(APP)
@@ -50,10 +60,14 @@ JWT: JWTManager = JWTManager(APP)
 # Setup Headers
 CORS(APP)
 
-from . import auth_providers
-
 # pylint: disable=C0413
 from . import db_models
 # pylint: disable=C0413
 from . import routes
+# pylint: disable=C0413
+from . import compression
+# pylint: disable=C0413
+from . import server
 
+# pylint: disable=C0413
+from . import benchmarks
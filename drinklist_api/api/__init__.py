@@ -1,18 +1,22 @@
 """
 Main API Module
 """
-from typing import List
+from typing import List, Tuple
 from functools import wraps
-from flask import Blueprint
-from flask_restplus import Api, Resource, abort, marshal
+from flask import Blueprint, Response, stream_with_context
+from flask_restplus import Api, Resource, abort, marshal, reqparse
+from sqlalchemy import and_, or_
+from sqlalchemy.engine import RowProxy
 from flask_jwt_extended import jwt_required, jwt_optional, get_jwt_claims, get_jwt_identity
 from flask_jwt_extended.exceptions import NoAuthorizationError
 from jwt import ExpiredSignatureError, InvalidTokenError
 
-from .. import APP, JWT, AUTH_LOGGER
+from .. import APP, DB, JWT, AUTH_LOGGER
 from ..login import AuthUser, UserRole
 
 from ..db_models.transaction import Transaction
+from ..db_models.replica import read_from_replica
+from ..export import EXPORT_FORMATS, EXPORT_MIMETYPES, export_transactions
 
 AUTHORIZATIONS = {
     'jwt': {
@@ -78,7 +82,7 @@ API = Api(API_BLUEPRINT, version='0.1', title='Drinklist API', doc='/doc/',
           description='API for the new FIUS Drinklist.', endpoint=APP.config['URI_BASE_PATH'])
 
 # pylint: disable=C0413
-from .api_models import ROOT_MODEL, TRANSACTION_GET
+from .api_models import ROOT_MODEL, HISTORY_PAGE
 
 @JWT.user_identity_loader
 def load_user_identity(user: AuthUser):
@@ -197,10 +201,43 @@ class RootResource(Resource):
 
 API.render_root = RootResource.get
 
-from . import user, beverage, authentication, transaction
+from . import user, beverage, authentication, transaction, statistics, reconciliation
+from .transaction import TRANSACTION_LIST_ARGUMENTS, transaction_select, serialize_transactions
+from .serializers import json_response
 
 HISTORY_NS = API.namespace('history', description='History', path='/history')
 
+HISTORY_ARGUMENTS = TRANSACTION_LIST_ARGUMENTS.copy()
+HISTORY_ARGUMENTS.add_argument('limit', type=int, location='args',
+                               help='Maximum number of transactions per page.')
+HISTORY_ARGUMENTS.add_argument('cursor', type=str, location='args',
+                               help='The next cursor of the previous page.')
+HISTORY_ARGUMENTS.add_argument('from', type=int, dest='from_timestamp', location='args',
+                               help='Only transactions at or after this unix timestamp.')
+HISTORY_ARGUMENTS.add_argument('to', type=int, dest='to_timestamp', location='args',
+                               help='Only transactions before this unix timestamp.')
+
+
+def encode_cursor(row: RowProxy) -> str:
+    """
+    Encode the keyset position (timestamp, id) of a transaction row as cursor
+    """
+    return '{}-{}'.format(row.timestamp, row.id)
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Decode a cursor created with encode_cursor
+
+    Aborts with 400 if the cursor is malformed.
+    """
+    try:
+        timestamp, transaction_id = cursor.split('-')
+        return int(timestamp), int(transaction_id)
+    except ValueError:
+        abort(400, 'Invalid cursor!')
+
+
 @HISTORY_NS.route('/')
 class HistoryResource(Resource):
     """
@@ -208,11 +245,65 @@ class HistoryResource(Resource):
     """
 
     #@jwt_required
-    @API.marshal_list_with(TRANSACTION_GET)
+    @API.expect(HISTORY_ARGUMENTS)
+    @HISTORY_NS.response(200, 'Success', HISTORY_PAGE)
+    @HISTORY_NS.response(400, 'Invalid cursor!')
+    @read_from_replica
     # pylint: disable=R0201
     def get(self):
         """
-        Get a list of all lendings currently in the system
+        Get a page of transactions, newest first
         """
-        return Transaction.query.all()
+        args = HISTORY_ARGUMENTS.parse_args()
+        limit = args['limit'] or APP.config['HISTORY_PAGE_SIZE']
+        limit = max(1, min(limit, APP.config['HISTORY_MAX_PAGE_SIZE']))
+
+        query = transaction_select(args['view'])
+        if args['from_timestamp'] is not None:
+            query = query.where(Transaction.timestamp >= args['from_timestamp'])
+        if args['to_timestamp'] is not None:
+            query = query.where(Transaction.timestamp < args['to_timestamp'])
+        if args['cursor']:
+            timestamp, transaction_id = decode_cursor(args['cursor'])
+            query = query.where(or_(Transaction.timestamp < timestamp,
+                                     and_(Transaction.timestamp == timestamp, Transaction.id < transaction_id)))
+
+        # fetch one more row than needed to know if there is a next page
+        query = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit + 1)
+        rows = DB.session.execute(query).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1])
+        # same output as marshal(page, HISTORY_PAGE or HISTORY_SUMMARY_PAGE)
+        return json_response({'items': serialize_transactions(rows, args['view']), 'next': next_cursor})
+
+
+EXPORT_ARGUMENTS = reqparse.RequestParser()
+EXPORT_ARGUMENTS.add_argument('format', type=str, dest='export_format', location='args',
+                              choices=EXPORT_FORMATS, default='ndjson', help='Export format.')
+EXPORT_ARGUMENTS.add_argument('from', type=int, dest='from_timestamp', location='args',
+                              help='Only transactions at or after this unix timestamp.')
+EXPORT_ARGUMENTS.add_argument('to', type=int, dest='to_timestamp', location='args',
+                              help='Only transactions before this unix timestamp.')
+
+
+@HISTORY_NS.route('/export/')
+class ExportResource(Resource):
+    """
+    Export of the whole transaction ledger
+    """
 
+    @jwt_required
+    @satisfies_role(UserRole.ADMIN)
+    @API.expect(EXPORT_ARGUMENTS)
+    @HISTORY_NS.produces(list(EXPORT_MIMETYPES.values()))
+    # pylint: disable=R0201
+    def get(self):
+        """
+        Stream all transactions as ndjson or csv
+        """
+        args = EXPORT_ARGUMENTS.parse_args()
+        lines = export_transactions(args['export_format'], args['from_timestamp'], args['to_timestamp'])
+        return Response(stream_with_context(lines), mimetype=EXPORT_MIMETYPES[args['export_format']])
@@ -18,6 +18,7 @@ AUTHENTICATION_ROUTES_MODEL = API.model('AuthenticationRoutesModel', {
     'fresh_login': fields.Url('api.auth_fresh_login'),
     'refresh': fields.Url('api.auth_refresh'),
     'check': fields.Url('api.auth_check'),
+    'role_cache': fields.Url('api.auth_role_cache'),
 })
 
 
@@ -64,6 +65,72 @@ TRANSACTION_GET = API.inherit('TransactionGET', TRANSACTION_GET_NOCHILD, {
     'cancels': fields.Nested(TRANSACTION_GET_NOCHILD),
 })
 
+TRANSACTION_SUMMARY = API.model('TransactionSummary', {
+    'id': fields.Integer(),
+    'timestamp': fields.Integer(),
+    'amount': fields.Integer(),
+    'reason': fields.String(),
+})
+
+TRANSACTION_BATCH_POST = API.inherit('TransactionBatchPOST', TRANSACTION_POST, {
+    'user': fields.String(required=True, max_length=STD_STRING_SIZE, title='Name of the user'),
+})
+
+TRANSACTION_BATCH_RESULT = API.model('TransactionBatchResult', {
+    'status': fields.Integer(example=201, title='Status of this transaction'),
+    'message': fields.String(title='Error message'),
+    'transaction': fields.Nested(TRANSACTION_GET, allow_null=True),
+})
+
+HISTORY_PAGE = API.model('HistoryPage', {
+    'items': fields.List(fields.Nested(TRANSACTION_GET)),
+    'next': fields.String(title='Cursor of the next page', description='Null if this is the last page.'),
+})
+
+HISTORY_SUMMARY_PAGE = API.model('HistorySummaryPage', {
+    'items': fields.List(fields.Nested(TRANSACTION_SUMMARY)),
+    'next': fields.String(title='Cursor of the next page', description='Null if this is the last page.'),
+})
+
 TRANSACTION_DELETE = API.model('TransactionDELETE', {
     'reason': fields.String(),
 })
+
+CONSUMPTION_GET = API.model('ConsumptionGET', {
+    'beverage_id': fields.Integer(min=1, example=1, title='Internal Identifier of the beverage'),
+    'day': fields.Integer(title='Unix timestamp of the start of the day'),
+    'count': fields.Integer(title='Sum of the counts of all transactions'),
+    'amount': fields.Integer(title='Sum of the amounts of all transactions'),
+})
+
+REVENUE_GET = API.model('RevenueGET', {
+    'start': fields.Integer(title='Unix timestamp of the start of the period'),
+    'count': fields.Integer(title='Sum of the counts of all transactions'),
+    'amount': fields.Integer(title='Sum of the amounts of all transactions'),
+})
+
+BALANCE_DRIFT = API.model('BalanceDrift', {
+    'id': fields.Integer(min=1, example=1, title='Internal Identifier'),
+    'name': fields.String(max_length=STD_STRING_SIZE, title='Name'),
+    'balance': fields.Integer(title='Current balance'),
+    'expected': fields.Integer(title='Balance according to the transactions'),
+    'drift': fields.Integer(title='Difference of balance and expected'),
+})
+
+STOCK_DRIFT = API.model('StockDrift', {
+    'id': fields.Integer(min=1, example=1, title='Internal Identifier'),
+    'name': fields.String(max_length=STD_STRING_SIZE, title='Name'),
+    'stock': fields.Integer(title='Current stock'),
+    'expected': fields.Integer(title='Stock according to the transactions and admin changes'),
+    'drift': fields.Integer(title='Difference of stock and expected'),
+})
+
+RECONCILIATION_REPORT = API.model('ReconciliationReport', {
+    'users': fields.List(fields.Nested(BALANCE_DRIFT)),
+    'beverages': fields.List(fields.Nested(STOCK_DRIFT)),
+})
+
+RECONCILIATION_FIX = API.model('ReconciliationFix', {
+    'users': fields.Integer(title='Number of fixed users'),
+    'beverages': fields.Integer(title='Number of fixed beverages'),
+})
@@ -6,7 +6,7 @@ from flask_jwt_extended import jwt_required, create_access_token, \
                                get_jwt_identity, create_refresh_token, \
                                get_jwt_claims, jwt_refresh_token_required
 
-from . import API
+from . import API, satisfies_role
 from .. import APP, DB, AUTH_LOGGER
 
 from .api_models import AUTHENTICATION_ROUTES_MODEL
@@ -36,6 +36,15 @@ CHECK_RESPONSE = API.model('check', {
     'role': fields.Integer(required=True, readonly=True)
 })
 
+ROLE_CACHE_STATS = API.model('RoleCacheStats', {
+    'provider': fields.String(readonly=True, title='Login provider'),
+    'size': fields.Integer(readonly=True, title='Number of cached users'),
+    'max_size': fields.Integer(readonly=True, title='Maximum number of cached users'),
+    'ttl': fields.Float(readonly=True, title='Seconds until a cached entry expires'),
+    'hits': fields.Integer(readonly=True),
+    'misses': fields.Integer(readonly=True),
+})
+
 SETTINGS = API.model('settings', {
     'settings': fields.String(required=True),
 })
@@ -130,14 +139,48 @@ class Refresh(Resource):
 
     @API.doc(security=['jwt-refresh'])
     @jwt_refresh_token_required
-    @API.response(401, 'Wrong username or pasword.')
+    @API.response(401, 'The roles of the user expired, please login again.')
     @API.marshal_with(JWT_RESPONSE)
     # pylint: disable=R0201
     def post(self):
-        """Create a new access token with a refresh token."""
+        """Create a new access token with a refresh token and the current role of the user."""
         user = AuthUser(get_jwt_identity(), None)
-        user.role = UserRole(get_jwt_claims())
+        role = LOGIN_SERVICE.current_role(user.name)
+        if role is None:
+            AUTH_LOGGER.info('User "%s" may not login anymore, refused a new access token.', user.name)
+            abort(401, 'The roles of the user expired, please login again.')
+        user.role = role
         AUTH_LOGGER.debug('User "%s" asked for a new access token.', user.name)
         new_token = create_access_token(identity=user, fresh=False)
         ret = {'access_token': new_token}
         return ret, 200
+
+
+@ANS.route('/role-cache/')
+class RoleCache(Resource):
+    """Resource for the role caches of the login providers."""
+
+    @jwt_required
+    @satisfies_role(UserRole.ADMIN)
+    @API.marshal_list_with(ROLE_CACHE_STATS)
+    # pylint: disable=R0201
+    def get(self):
+        """Get the hit/miss statistics of all role caches."""
+        return [dict(stats, provider=provider) for provider, stats in LOGIN_SERVICE.role_cache_stats().items()]
+
+
+@ANS.route('/role-cache/<string:user_name>/')
+class RoleCacheUser(Resource):
+    """Resource for the cached roles of a single user."""
+
+    @jwt_required
+    @satisfies_role(UserRole.ADMIN)
+    @ANS.response(204, 'Cached roles removed.')
+    @ANS.response(404, 'User is not cached.')
+    # pylint: disable=R0201
+    def delete(self, user_name: str):
+        """Remove the cached roles of a user, so they are searched again with the next login or token refresh."""
+        if not LOGIN_SERVICE.flush_user(user_name):
+            abort(404, 'User is not cached.')
+        AUTH_LOGGER.info('Removed cached roles of user "%s".', user_name)
+        return '', 204
@@ -1,22 +1,87 @@
-from flask import request
+from hashlib import sha1
+from threading import Lock
+from time import monotonic
+from typing import Callable, Optional, Tuple
+
+from flask import g, request, Response
 from flask_restplus import Api, Resource, abort, marshal
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import select
 
 from . import API
 from . import APP, satisfies_role
 from .api_models import BEVERAGE_GET
 from .api_models import BEVERAGE_POST
 from .api_models import BEVERAGE_PUT
+from .serializers import compile_serializer, json_body
 
 from flask_jwt_extended import jwt_required
 
 from .. import DB
 from ..db_models.beverage import Beverage
+from ..db_models.replica import read_from_replica
 from ..login import UserRole
 
 
 BEVERAGE_NS = API.namespace('beverages', description='Beverages', path='/beverages')
 
+BEVERAGE_SERIALIZER = compile_serializer(BEVERAGE_GET)
+
+
+class BeverageCatalogCache():
+    """
+    In-process cache of the serialized beverage list.
+
+    Entries are dropped on invalidate() and after BEVERAGE_CACHE_TTL seconds, so changes made
+    by other worker processes become visible after at most the ttl. Catalogs read from the read
+    replica are not cached, as they may miss the change that invalidated the cache.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = Lock()
+        self._version = 0
+        self._entry: Optional[Tuple[str, bytes, float]] = None
+
+    def invalidate(self):
+        """
+        Drop the cached catalog. Must be called after every committed change of a beverage.
+        """
+        with self._lock:
+            self._version += 1
+            self._entry = None
+
+    def get(self, load: Callable[[], bytes], store: bool = True) -> Tuple[str, bytes]:
+        """
+        Get the etag and body of the catalog, calling load to build the body on a cache miss.
+
+        The loaded catalog is only cached if store is set.
+        """
+        with self._lock:
+            version = self._version
+            entry = self._entry
+        if entry is not None and monotonic() - entry[2] < self.ttl:
+            return entry[0], entry[1]
+
+        body = load()
+        etag = sha1(body).hexdigest()
+        with self._lock:
+            # do not cache data that was loaded while a concurrent change was committed
+            if store and version == self._version:
+                self._entry = (etag, body, monotonic())
+        return etag, body
+
+
+BEVERAGE_CACHE = BeverageCatalogCache(APP.config['BEVERAGE_CACHE_TTL'])
+
+
+def load_beverage_list() -> bytes:
+    """
+    Load and serialize the list of all beverages like API.marshal_list_with(BEVERAGE_GET) does.
+    """
+    return json_body([BEVERAGE_SERIALIZER(row) for row in DB.session.execute(select([Beverage.__table__]))])
+
+
 @BEVERAGE_NS.route('/')
 class BeverageList(Resource):
     """
@@ -24,13 +89,24 @@ class BeverageList(Resource):
     """
 
     @jwt_required
-    @API.marshal_list_with(BEVERAGE_GET)
+    @BEVERAGE_NS.response(200, 'Success', [BEVERAGE_GET])
+    @BEVERAGE_NS.response(304, 'Not modified.')
+    @read_from_replica
     # pylint: disable=R0201
     def get(self):
         """
         Get a list of all beverages currently in the system
+
+        Supports conditional requests with If-None-Match.
         """
-        return Beverage.query.all()
+        etag, body = BEVERAGE_CACHE.get(load_beverage_list, store=not g.get('read_replica', False))
+        # weak comparison, the etag is weakened when the response is compressed
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
 
     @jwt_required
     @satisfies_role(UserRole.ADMIN)
@@ -46,6 +122,7 @@ class BeverageList(Resource):
         try:
             DB.session.add(new)
             DB.session.commit()
+            BEVERAGE_CACHE.invalidate()
             return marshal(new, BEVERAGE_GET), 201
         except IntegrityError as err:
             message = str(err)
@@ -88,4 +165,5 @@ class BeverageDetail(Resource):
 
         beverage.update(**request.get_json())
         DB.session.commit()
+        BEVERAGE_CACHE.invalidate()
         return marshal(beverage, BEVERAGE_GET), 200
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Comparison of balances and stocks with the transaction ledger
+"""
+
+from flask_restplus import Resource, marshal
+from flask_jwt_extended import jwt_required
+
+from . import API, satisfies_role
+from .api_models import RECONCILIATION_REPORT, RECONCILIATION_FIX
+from .beverage import BEVERAGE_CACHE
+
+from .. import DB
+from ..login import UserRole
+from ..reconcile import balance_drift, stock_drift, fix_drift
+
+
+RECONCILIATION_NS = API.namespace('reconciliation', description='Reconciliation with the ledger',
+                                  path='/reconciliation')
+
+
+@RECONCILIATION_NS.route('/')
+class Reconciliation(Resource):
+    """
+    Drift of balances and stocks
+    """
+
+    @jwt_required
+    @satisfies_role(UserRole.ADMIN)
+    @API.marshal_with(RECONCILIATION_REPORT)
+    # pylint: disable=R0201
+    def get(self):
+        """
+        Get all users and beverages whose balance or stock differs from the ledger
+        """
+        return {'users': list(balance_drift()), 'beverages': list(stock_drift())}
+
+    @jwt_required
+    @satisfies_role(UserRole.ADMIN)
+    @RECONCILIATION_NS.response(200, 'Success', RECONCILIATION_FIX)
+    # pylint: disable=R0201
+    def post(self):
+        """
+        Set all drifted balances and stocks to their values according to the ledger
+        """
+        fixed_users, fixed_beverages = fix_drift()
+        DB.session.commit()
+        BEVERAGE_CACHE.invalidate()
+        return marshal({'users': fixed_users, 'beverages': fixed_beverages}, RECONCILIATION_FIX), 200
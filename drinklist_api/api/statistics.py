@@ -0,0 +1,92 @@
+"""
+Read-only consumption statistics, served from the daily consumption rollup
+"""
+
+from flask_restplus import Resource, reqparse
+from flask_jwt_extended import jwt_required
+from sqlalchemy.sql import func
+
+from . import API, APP, satisfies_role
+from .api_models import CONSUMPTION_GET, REVENUE_GET
+
+from .. import DB
+from ..db_models.consumption import BeverageConsumption, DAY, day_start
+from ..login import UserRole
+
+
+STATISTICS_NS = API.namespace('statistics', description='Consumption statistics', path='/statistics')
+
+WEEK = 7 * DAY
+
+STATISTICS_ARGUMENTS = reqparse.RequestParser()
+STATISTICS_ARGUMENTS.add_argument('from', type=int, dest='from_timestamp', location='args',
+                                  help='Only days at or after the day of this unix timestamp.')
+STATISTICS_ARGUMENTS.add_argument('to', type=int, dest='to_timestamp', location='args',
+                                  help='Only days starting before this unix timestamp.')
+
+CONSUMPTION_ARGUMENTS = STATISTICS_ARGUMENTS.copy()
+CONSUMPTION_ARGUMENTS.add_argument('beverage', type=int, dest='beverage_id', location='args',
+                                   help='Only the consumption of this beverage.')
+
+REVENUE_ARGUMENTS = STATISTICS_ARGUMENTS.copy()
+REVENUE_ARGUMENTS.add_argument('period', type=str, location='args', choices=('day', 'week'), default='week',
+                               help='Length of the summed up periods. Weeks start on monday.')
+
+
+def filter_days(query, args: dict):
+    """
+    Apply the from and to arguments to a query of the rollup.
+    """
+    if args['from_timestamp'] is not None:
+        query = query.filter(BeverageConsumption.day >= day_start(args['from_timestamp']))
+    if args['to_timestamp'] is not None:
+        query = query.filter(BeverageConsumption.day < args['to_timestamp'])
+    return query
+
+
+@STATISTICS_NS.route('/consumption/')
+class ConsumptionList(Resource):
+    """
+    Consumption per beverage and day
+    """
+
+    @jwt_required
+    @API.expect(CONSUMPTION_ARGUMENTS)
+    @API.marshal_list_with(CONSUMPTION_GET)
+    # pylint: disable=R0201
+    def get(self):
+        """
+        Get the summed up counts and amounts per beverage and day, oldest first
+        """
+        args = CONSUMPTION_ARGUMENTS.parse_args()
+        query = filter_days(BeverageConsumption.query, args)
+        if args['beverage_id'] is not None:
+            query = query.filter(BeverageConsumption.beverage_id == args['beverage_id'])
+        return query.order_by(BeverageConsumption.day, BeverageConsumption.beverage_id).all()
+
+
+@STATISTICS_NS.route('/revenue/')
+class RevenueList(Resource):
+    """
+    Revenue of all beverages per day or week
+    """
+
+    @jwt_required
+    @satisfies_role(UserRole.ADMIN)
+    @API.expect(REVENUE_ARGUMENTS)
+    @API.marshal_list_with(REVENUE_GET)
+    # pylint: disable=R0201
+    def get(self):
+        """
+        Get the summed up counts and amounts of all beverages per day or week, oldest first
+        """
+        args = REVENUE_ARGUMENTS.parse_args()
+        start = BeverageConsumption.day
+        if args['period'] == 'week':
+            # the first of january 1970 was a thursday
+            start = start - (start + APP.config['STATISTICS_UTC_OFFSET'] + 3 * DAY) % WEEK
+        start = start.label('start')
+        query = filter_days(DB.session.query(start,
+                                             func.sum(BeverageConsumption.count).label('count'),
+                                             func.sum(BeverageConsumption.amount).label('amount')), args)
+        return [row._asdict() for row in query.group_by(start).order_by(start)]
@@ -1,26 +1,206 @@
 import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 from flask import request
-from flask_restplus import Api, Resource, abort, marshal
+from flask_restplus import Api, Resource, abort, marshal, reqparse
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql import func
+from sqlalchemy.sql import bindparam, func, select
 from flask_jwt_extended import jwt_required, get_jwt_claims
 
 
 from . import API
 from . import APP, satisfies_role
 from .api_models import TRANSACTION_GET
+from .api_models import TRANSACTION_SUMMARY
 from .api_models import TRANSACTION_POST
 from .api_models import TRANSACTION_DELETE
+from .api_models import TRANSACTION_BATCH_POST
+from .api_models import TRANSACTION_BATCH_RESULT
+from .beverage import BEVERAGE_CACHE
+from .serializers import compile_serializer, json_response
 
 from .. import DB
 from ..db_models.transaction import Transaction
 from ..db_models.user import User
 from ..db_models.transaction_beverage import TransactionBeverage
 from ..db_models.beverage import Beverage
+from ..db_models.consumption import BeverageConsumption
+from ..db_models.replica import read_from_replica
 from ..login import UserRole
 
 
 USER_NS = API.namespace('users', description='Users', path='/users')
+TRANSACTION_NS = API.namespace('transactions', description='Transactions', path='/transactions')
+
+
+TRANSACTION_VIEWS = ('summary', 'full')
+
+TRANSACTION_LIST_ARGUMENTS = reqparse.RequestParser()
+TRANSACTION_LIST_ARGUMENTS.add_argument('view', type=str, location='args', choices=TRANSACTION_VIEWS, default='full',
+                                        help='summary omits the beverages and the canceled transaction.')
+
+
+TRANSACTION_SERIALIZERS = {
+    'summary': compile_serializer(TRANSACTION_SUMMARY),
+    'full': compile_serializer(TRANSACTION_GET),
+}
+
+# maximum number of values of one expanding IN parameter
+IN_CHUNK_SIZE = 500
+
+
+def chunks(values: Sequence[int], size: int = IN_CHUNK_SIZE) -> Iterator[Sequence[int]]:
+    """
+    Split values into chunks small enough for one IN clause.
+    """
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def transaction_select(view: str):
+    """
+    Core SELECT of the transaction columns needed for the given view.
+    """
+    table = Transaction.__table__
+    if view == 'summary':
+        return select([table.c.id, table.c.timestamp, table.c.amount, table.c.reason])
+    return select([table])
+
+
+def load_transaction_beverages(transaction_ids: Sequence[int]) -> Dict[int, List[dict]]:
+    """
+    Load the beverages of the transactions as plain dicts (transaction id -> beverages).
+    """
+    lines = TransactionBeverage.__table__
+    beverages = Beverage.__table__
+    query = (select([lines.c.transaction_id, lines.c.count, lines.c.price, beverages.c.id, beverages.c.name,
+                     beverages.c.price.label('beverage_price'), beverages.c.stock])
+             .select_from(lines.outerjoin(beverages, lines.c.beverage_id == beverages.c.id))
+             .where(lines.c.transaction_id.in_(bindparam('ids', expanding=True)))
+             .order_by(lines.c.transaction_id, lines.c.beverage_id))
+    result: Dict[int, List[dict]] = {}
+    for chunk in chunks(transaction_ids):
+        for row in DB.session.execute(query, {'ids': chunk}).fetchall():
+            beverage = None
+            if row.id is not None:
+                beverage = {'id': row.id, 'name': row.name, 'price': row.beverage_price, 'stock': row.stock}
+            result.setdefault(row.transaction_id, []).append({'beverage': beverage, 'count': row.count,
+                                                              'price': row.price})
+    return result
+
+
+def serialize_transactions(rows: Sequence, view: str) -> List[dict]:
+    """
+    Serialize transaction rows selected with transaction_select for the given view.
+
+    The rows are plain Core rows, no ORM objects are created. The full view loads the
+    canceled transactions with one and all beverages with one more SELECT ... IN query.
+    """
+    serialize = TRANSACTION_SERIALIZERS[view]
+    if view == 'summary':
+        return [serialize(row) for row in rows]
+    transactions = [dict(row) for row in rows]
+    # cancels_id is set on the canceled transaction and references its cancellation
+    table = Transaction.__table__
+    query = select([table]).where(table.c.cancels_id.in_(bindparam('ids', expanding=True)))
+    canceled = {}
+    for chunk in chunks([transaction['id'] for transaction in transactions]):
+        for row in DB.session.execute(query, {'ids': chunk}).fetchall():
+            canceled[row.cancels_id] = dict(row)
+    transaction_ids = {transaction['id'] for transaction in transactions}
+    transaction_ids.update(transaction['id'] for transaction in canceled.values())
+    beverages = load_transaction_beverages(sorted(transaction_ids))
+    for transaction in canceled.values():
+        transaction['beverages'] = beverages.get(transaction['id'], [])
+    for transaction in transactions:
+        transaction['beverages'] = beverages.get(transaction['id'], [])
+        transaction['cancels'] = canceled.get(transaction['id'])
+    return [serialize(transaction) for transaction in transactions]
+
+
+def transaction_error(beverages: Optional[List[dict]], amount: int, role: int) -> Optional[str]:
+    """
+    Check whether a new transaction with the given beverages and amount is allowed.
+
+    Returns the error message if it is not allowed, else None.
+    """
+    if role < UserRole.ADMIN and not beverages:
+        return 'Only Admin are allowed to handle Transactions without beverages!'
+    if not beverages and amount == 0:
+        return 'Either amount or beverages has to be set!'
+    if beverages and amount != 0:
+        return 'Only either amount or beverages have to be set!'
+    return None
+
+
+def beverages_error(beverages) -> Optional[str]:
+    """
+    Check that every beverage of a new transaction has a beverage id and a count and is listed only once.
+
+    Returns the error message if not, else None.
+    """
+    if beverages is None:
+        return None
+    if not isinstance(beverages, list):
+        return 'Beverages have to be a list!'
+    beverage_ids = set()
+    for beverage in beverages:
+        if (not isinstance(beverage, dict) or not isinstance(beverage.get('beverage'), dict)
+                or not isinstance(beverage['beverage'].get('id'), int) or not isinstance(beverage.get('count'), int)):
+            return 'Every beverage needs a beverage id and a count!'
+        if beverage['beverage']['id'] in beverage_ids:
+            return 'A beverage is listed more than once!'
+        beverage_ids.add(beverage['beverage']['id'])
+    return None
+
+
+def for_update(query):
+    """
+    Lock the selected rows until the end of the database transaction if TRANSACTION_ROW_LOCKING is set.
+
+    Rows must always be locked (and updated) in the order users, beverages to avoid deadlocks.
+    """
+    if APP.config['TRANSACTION_ROW_LOCKING']:
+        return query.with_for_update()
+    return query
+
+
+def add_transaction(user: User, amount: int, reason: str, beverages: Optional[List[dict]],
+                    refered_beverages: Dict[int, Beverage], balance_changes: Dict[int, int],
+                    stock_changes: Dict[int, int], consumption_changes: Dict[Tuple[int, int], List[int]]) -> Transaction:
+    """
+    Add a new transaction and its beverages to the session.
+
+    Every beverage in beverages must be contained in refered_beverages (beverage id -> Beverage).
+    The resulting balance, stock and consumption changes are added to balance_changes (user id -> delta),
+    stock_changes (beverage id -> delta) and consumption_changes (see BeverageConsumption.collect)
+    and must be written with apply_changes.
+    """
+    new_transaction = Transaction(user, amount, reason)
+    DB.session.add(new_transaction)
+    if beverages:
+        new_amount = 0
+        for beverage in beverages:
+            refered_beverage = refered_beverages[beverage['beverage']['id']]
+            new_beverage = TransactionBeverage(new_transaction, refered_beverage, beverage['count'], refered_beverage.price)
+            new_amount += beverage['count']*refered_beverage.price
+            stock_changes[refered_beverage.id] = stock_changes.get(refered_beverage.id, 0) + beverage['count']
+            BeverageConsumption.collect(consumption_changes, refered_beverage.id, new_transaction.timestamp,
+                                        beverage['count'], refered_beverage.price)
+            DB.session.add(new_beverage)
+        new_transaction.amount = new_amount
+    balance_changes[user.id] = balance_changes.get(user.id, 0) + new_transaction.amount
+    return new_transaction
+
+
+def apply_changes(balance_changes: Dict[int, int], stock_changes: Dict[int, int],
+                  consumption_changes: Dict[Tuple[int, int], List[int]]):
+    """
+    Write balance, stock and consumption changes with atomic UPDATEs instead of read-modify-write in python.
+    """
+    User.change_balances(balance_changes)
+    Beverage.change_stocks(stock_changes)
+    BeverageConsumption.change_consumption(consumption_changes)
+
 
 @USER_NS.route('/<string:user_name>/transactions/')
 class TransactionList(Resource):
@@ -30,17 +210,21 @@ class TransactionList(Resource):
    
     @jwt_required
     @satisfies_role(UserRole.KIOSK_USER, user_self_allowed=True)
-    @API.marshal_list_with(TRANSACTION_GET)
+    @API.expect(TRANSACTION_LIST_ARGUMENTS)
+    @USER_NS.response(200, 'Success', [TRANSACTION_GET])
     @USER_NS.response(404, 'Requested User does not exist!')
+    @read_from_replica
     # pylint: disable=R0201
     def get(self, user_name: str):
         """
         Get a list of all transactions of the specified user currently in the system
         """
+        view = TRANSACTION_LIST_ARGUMENTS.parse_args()['view']
         user = User.query.filter(User.name == user_name).first()
         if user is None:
             abort(404, 'Requested User does not exist!')
-        return Transaction.query.filter(Transaction.user_id == user.id).all()
+        rows = DB.session.execute(transaction_select(view).where(Transaction.user_id == user.id)).fetchall()
+        return json_response(serialize_transactions(rows, view))
 
     @jwt_required
     @satisfies_role(UserRole.KIOSK_USER, user_self_allowed=True)
@@ -49,6 +233,7 @@ class TransactionList(Resource):
     @USER_NS.response(400, 'Either amount or beverages has to be set!')
     @USER_NS.response(400, 'Only either amount or beverages have to be set!')
     @USER_NS.response(400, 'Specified beverage does not exist')
+    @USER_NS.response(400, 'A beverage is listed more than once!')
     @USER_NS.response(404, 'Specified User does not exist!')
     @USER_NS.response(409, 'Name is not unique!')
     @USER_NS.response(201, 'Created.')
@@ -57,33 +242,28 @@ class TransactionList(Resource):
         """
         Add a new transaction to the database
         """
-        new_amount = 0
-        user = User.query.filter(User.name == user_name).first()
+        user = for_update(User.query.filter(User.name == user_name)).first()
         if user is None:
             abort(404, 'Specified User does not exist!')
-        new_transaction = Transaction(user, request.get_json()['amount'], request.get_json()['reason'])
         beverages = request.get_json()['beverages']
-        if (get_jwt_claims() < UserRole.ADMIN and (beverages is None or len(beverages) == 0)):
-            abort(400, 'Only Admin are allowed to handle Transactions without beverages!')
-        if (beverages is None or len(beverages) == 0) and (request.get_json()['amount'] == 0):
-            abort(400, 'Either amount or beverages has to be set!')
-        if (not (beverages is None or len(beverages) == 0)) and (not (request.get_json()['amount'] == 0)):
-            abort(400, 'Only either amount or beverages have to be set!')
+        error = beverages_error(beverages) or transaction_error(beverages, request.get_json()['amount'], get_jwt_claims())
+        if error is not None:
+            abort(400, error)
+        beverage_ids = {beverage['beverage']['id'] for beverage in beverages or []}
+        refered_beverages = {}
+        if beverage_ids:
+            beverage_query = Beverage.query.filter(Beverage.id.in_(beverage_ids)).order_by(Beverage.id)
+            refered_beverages = {beverage.id: beverage for beverage in for_update(beverage_query)}
+        if len(refered_beverages) < len(beverage_ids):
+            abort(400, 'Specified beverage does not exist')
         try:
-            DB.session.add(new_transaction)
-            for beverage in beverages:
-                refered_beverage_id = beverage['beverage']['id']
-                refered_beverage = Beverage.query.filter(Beverage.id == refered_beverage_id).first()
-                if refered_beverage is None:
-                    abort(400, 'Specified beverage does not exist')
-                new_beverage = TransactionBeverage(new_transaction, refered_beverage, beverage['count'], refered_beverage.price)
-                new_amount += beverage['count']*refered_beverage.price
-                refered_beverage.stock += beverage['count']
-                DB.session.add(new_beverage)
-            if not (beverages is None or len(beverages) == 0):
-                new_transaction.amount = new_amount
-            user.balance += new_transaction.amount
+            balance_changes, stock_changes, consumption_changes = {}, {}, {}
+            new_transaction = add_transaction(user, request.get_json()['amount'], request.get_json()['reason'],
+                                              beverages, refered_beverages, balance_changes, stock_changes,
+                                              consumption_changes)
+            apply_changes(balance_changes, stock_changes, consumption_changes)
             DB.session.commit()
+            BEVERAGE_CACHE.invalidate()
             return marshal(new_transaction, TRANSACTION_GET), 201
         except IntegrityError as err:
             message = str(err)
@@ -130,39 +310,133 @@ class UserDetail(Resource):
         """
         Revert specified transaction in the database (adds a revertTransaction)
         """
-        user = User.query.filter(User.name == user_name).first()
+        user = for_update(User.query.filter(User.name == user_name)).first()
         if user is None:
             abort(404, 'Specified User does not exist!')
         reason = request.get_json()['reason']
-        transaction = Transaction.query.join(User).filter(Transaction.id == transaction_id).filter(User.name == user_name).first()
-        already_canceled = Transaction.query.filter(Transaction.cancels == Transaction.query.filter(Transaction.id == transaction_id).first()).first()
-        print(already_canceled)
-        if already_canceled:
-            abort(403, 'It is not allowed to cancel a transaction multipletimes, the transaction is already cancelled!')
+        transaction = (Transaction.query
+                       .filter(Transaction.id == transaction_id)
+                       .filter(Transaction.user_id == user.id)
+                       .first())
         if transaction is None:
             abort(404, 'Specified Transaction does not exist for this User!')
+        # cancels_id is set on the canceled transaction and references its cancellation,
+        # also if the canceled transaction is itself a cancellation
+        if transaction.cancels_id is not None:
+            abort(403, 'It is not allowed to cancel a transaction multipletimes, the transaction is already cancelled!')
         if (get_jwt_claims() < UserRole.ADMIN and (transaction.beverages is None or len(transaction.beverages) == 0)):
             abort(400, 'Only Admin are allowed to handle Transactions without beverages!')
         if(get_jwt_claims() < UserRole.ADMIN and time.time() > transaction.timestamp + 5 * 60): #Admins can always revert
             abort(400, 'Chosen Transaction is too old to be reverted!')
         else:
-            old_transaction = transaction
-            if transaction.cancels is not None:
-                old_transaction = None
-            reverse_transaction = Transaction(transaction.user, -transaction.amount, reason, old_transaction)
+            reverse_transaction = Transaction(transaction.user, -transaction.amount, reason)
             beverages = transaction.beverages
             try:
                 DB.session.add(reverse_transaction)
+                stock_changes, consumption_changes = {}, {}
                 for beverage in beverages:
                     reversed_beverage = TransactionBeverage(reverse_transaction, beverage.beverage, -(beverage.count), beverage.price)
                     DB.session.add(reversed_beverage)
-                    refered_beverage = Beverage.query.filter(Beverage.id == beverage.beverage_id).first()
-                    refered_beverage.stock += reversed_beverage.count
-                user.balance += reverse_transaction.amount
+                    stock_changes[beverage.beverage_id] = reversed_beverage.count
+                    BeverageConsumption.collect(consumption_changes, beverage.beverage_id, reverse_transaction.timestamp,
+                                                reversed_beverage.count, reversed_beverage.price)
+                DB.session.flush()
+                # only link the cancellation if no concurrent request canceled the transaction first
+                table = Transaction.__table__
+                linked = DB.session.execute(table.update()
+                                            .where(table.c.id == transaction.id)
+                                            .where(table.c.cancels_id.is_(None))
+                                            .values(cancels_id=reverse_transaction.id)).rowcount
+                if not linked:
+                    DB.session.rollback()
+                    abort(403, 'It is not allowed to cancel a transaction multipletimes, the transaction is already cancelled!')
+                apply_changes({user.id: reverse_transaction.amount}, stock_changes, consumption_changes)
                 DB.session.commit()
+                BEVERAGE_CACHE.invalidate()
                 return marshal(reverse_transaction, TRANSACTION_GET), 201
             except IntegrityError as err:
                 message = str(err)
                 if APP.config['DB_UNIQUE_CONSTRAIN_FAIL'] in message:
                     abort(409, 'Name is not unique!')
                 abort(500)
+
+
+@TRANSACTION_NS.route('/batch/')
+class TransactionBatch(Resource):
+    """
+    Many transactions of different users at once
+    """
+
+    @jwt_required
+    @satisfies_role(UserRole.KIOSK_USER)
+    @API.expect([TRANSACTION_BATCH_POST])
+    @TRANSACTION_NS.response(201, 'All transactions created.', [TRANSACTION_BATCH_RESULT])
+    @TRANSACTION_NS.response(207, 'Some transactions could not be created.', [TRANSACTION_BATCH_RESULT])
+    @TRANSACTION_NS.response(409, 'Name is not unique!')
+    # pylint: disable=R0201
+    def post(self):
+        """
+        Add many new transactions to the database in a single database transaction
+
+        Invalid transactions are skipped and reported with their own status and message.
+        """
+        entries = request.get_json()
+        if not isinstance(entries, list):
+            entries = [entries]
+
+        # malformed entries are reported per entry below, only valid entries are looked up
+        errors = [None if isinstance(entry, dict) else 'A transaction has to be an object!' for entry in entries]
+        errors = [error or beverages_error(entry.get('beverages')) for entry, error in zip(entries, errors)]
+        valid_entries = [entry for entry, error in zip(entries, errors) if error is None]
+        user_names = {entry.get('user') for entry in valid_entries}
+        beverage_ids = {beverage['beverage']['id'] for entry in valid_entries for beverage in entry.get('beverages') or []}
+        users = {}
+        if user_names:
+            user_query = User.query.filter(User.name.in_(user_names)).order_by(User.id)
+            users = {user.name: user for user in for_update(user_query)}
+        refered_beverages = {}
+        if beverage_ids:
+            beverage_query = Beverage.query.filter(Beverage.id.in_(beverage_ids)).order_by(Beverage.id)
+            refered_beverages = {beverage.id: beverage for beverage in for_update(beverage_query)}
+
+        role = get_jwt_claims()
+        results = []
+        balance_changes, stock_changes, consumption_changes = {}, {}, {}
+        for entry, error in zip(entries, errors):
+            if error is not None:
+                results.append({'status': 400, 'message': error})
+                continue
+            user = users.get(entry.get('user'))
+            beverages = entry.get('beverages')
+            amount = entry.get('amount', 0)
+            if user is None:
+                results.append({'status': 404, 'message': 'Specified User does not exist!'})
+                continue
+            error = transaction_error(beverages, amount, role)
+            if error is None and any(b['beverage']['id'] not in refered_beverages for b in beverages or []):
+                error = 'Specified beverage does not exist'
+            if error is not None:
+                results.append({'status': 400, 'message': error})
+                continue
+            new_transaction = add_transaction(user, amount, entry.get('reason'), beverages, refered_beverages,
+                                              balance_changes, stock_changes, consumption_changes)
+            results.append({'status': 201, 'transaction': new_transaction})
+
+        try:
+            apply_changes(balance_changes, stock_changes, consumption_changes)
+            DB.session.flush()
+            new_ids = [result['transaction'].id for result in results if result['status'] == 201]
+            DB.session.commit()
+            BEVERAGE_CACHE.invalidate()
+        except IntegrityError as err:
+            message = str(err)
+            if APP.config['DB_UNIQUE_CONSTRAIN_FAIL'] in message:
+                abort(409, 'Name is not unique!')
+            abort(500)
+
+        # reload all new transactions with one query instead of one refresh per transaction while marshalling
+        if new_ids:
+            Transaction.query.filter(Transaction.id.in_(new_ids)).all()
+
+        status = 201 if all(result['status'] == 201 for result in results) else 207
+        return marshal(results, TRANSACTION_BATCH_RESULT), status
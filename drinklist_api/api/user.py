@@ -3,18 +3,23 @@ from flask_restplus import Api, Resource, abort, marshal
 from flask_jwt_extended import jwt_required
 
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import select
 
 
 from . import API, satisfies_role
 from .api_models import USER_GET, USER_PUT
+from .serializers import compile_serializer, json_response
 
-from .. import DB
+from .. import APP, DB
 from ..db_models.user import User
+from ..db_models.replica import read_from_replica
 from ..login import UserRole
 
 
 USER_NS = API.namespace('users', description='Users', path='/users')
 
+USER_SERIALIZER = compile_serializer(USER_GET)
+
 @USER_NS.route('/')
 class UserList(Resource):
     """
@@ -23,13 +28,20 @@ class UserList(Resource):
 
     @jwt_required
     @satisfies_role(UserRole.KIOSK_USER)
-    @API.marshal_list_with(USER_GET)
+    @USER_NS.response(200, 'Success', [USER_GET])
+    @USER_NS.param(APP.config['RESTPLUS_MASK_HEADER'], 'An optional fields mask', _in='header', format='mask')
+    @read_from_replica
     # pylint: disable=R0201
     def get(self):
         """
         Get a list of all users currently in the system
         """
-        return User.query.all()
+        mask = request.headers.get(APP.config['RESTPLUS_MASK_HEADER'])
+        if mask:
+            # field masks are only supported by marshal
+            return marshal(User.query.all(), USER_GET, mask=mask), 200
+        rows = DB.session.execute(select([User.__table__]))
+        return json_response([USER_SERIALIZER(row) for row in rows])
 
 @USER_NS.route('/<string:user_name>/')
 class UserDetail(Resource):
@@ -1,6 +1,27 @@
 """
 Authentication Providers
+
+The module of a provider is only imported when the provider is used, so e.g. ldap3 is not
+loaded unless LDAP is configured in LOGIN_PROVIDERS.
 """
 
-from .. import APP
-from . import ldap_auth_provider, basic_auth_provider
+from importlib import import_module
+
+# provider name -> module of the provider
+PROVIDER_MODULES = {
+    'Basic': 'basic_auth_provider',
+    'LDAP': 'ldap_auth_provider',
+}
+
+
+def load_provider(name: str) -> bool:
+    """
+    Import the module of the provider with the given name, which registers the provider.
+
+    Returns False if there is no provider with this name.
+    """
+    module = PROVIDER_MODULES.get(name)
+    if module is None:
+        return False
+    import_module('.' + module, __name__)
+    return True
@@ -1,14 +1,110 @@
 """
 Auth Providers which provides LDAP login
 """
-from typing import List
+import re
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
-from ldap3 import Connection, Server, AUTO_BIND_TLS_BEFORE_BIND, SUBTREE
+from ldap3 import Connection, Server, AUTO_BIND_NONE, AUTO_BIND_TLS_BEFORE_BIND, SUBTREE, MOCK_SYNC, MOCK_ASYNC
 from ldap3.core.exceptions import LDAPSocketOpenError, LDAPBindError
+from ldap3.operation.search import FilterNode, parse_filter, AND, OR, NOT, MATCH_APPROX, MATCH_EQUAL, \
+                                   MATCH_GREATER_OR_EQUAL, MATCH_LESS_OR_EQUAL, MATCH_PRESENT, MATCH_SUBSTRING
+from ldap3.utils.conv import escape_filter_chars
+from ldap3.utils.dn import escape_rdn
 
-from ..login import LoginProvider
+from ..login import LoginProvider, UserRole
 from .. import APP, AUTH_LOGGER
+from .ldap_connection_pool import LDAPConnectionPool
+from .role_cache import RoleCache
 
+CONSUMER = 'consumer'
+KIOSK_USER = 'kiosk_user'
+ADMIN = 'admin'
+
+EntryAttributes = Dict[str, List[str]]  # lower case attribute name -> lower case values
+
+ESCAPED_CHAR = re.compile(rb'\\([0-9a-fA-F]{2})')
+
+
+def compile_filter(search_filter: str) -> Optional[FilterNode]:
+    """
+    Parse a filter for the local evaluation with match_filter. Returns None for an empty filter.
+
+    Raises:
+        ValueError -- If the filter uses extensible matching, which can not be evaluated locally
+    """
+    if not search_filter:
+        return None
+    root = parse_filter(search_filter, None, False, False, None, False).elements[0]
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        if node.tag not in (AND, OR, NOT, MATCH_APPROX, MATCH_EQUAL, MATCH_GREATER_OR_EQUAL,
+                            MATCH_LESS_OR_EQUAL, MATCH_PRESENT, MATCH_SUBSTRING):
+            raise ValueError('Unsupported LDAP filter "{}".'.format(search_filter))
+        nodes.extend(node.elements)
+    return root
+
+
+def filter_attributes(node: Optional[FilterNode]) -> Set[str]:
+    """
+    Get the names of all attributes used in a compiled filter.
+    """
+    if node is None:
+        return set()
+    if node.assertion is not None:
+        return {node.assertion['attr']}
+    return set().union(*(filter_attributes(element) for element in node.elements))
+
+
+def assertion_value(value: bytes) -> str:
+    """
+    Unescape and normalize an assertion value of a compiled filter.
+    """
+    return ESCAPED_CHAR.sub(lambda match: bytes([int(match.group(1), 16)]), value).decode('utf-8').lower()
+
+
+# pylint: disable=R0911
+def match_filter(node: Optional[FilterNode], attributes: EntryAttributes) -> bool:
+    """
+    Evaluate a compiled filter against the attributes of an entry.
+
+    Values are compared case insensitive, which matches the equality rules of the usual
+    name, uid, member and dn attributes. An empty filter matches every entry.
+    """
+    if node is None:
+        return True
+    if node.tag == AND:
+        return all(match_filter(element, attributes) for element in node.elements)
+    if node.tag == OR:
+        return any(match_filter(element, attributes) for element in node.elements)
+    if node.tag == NOT:
+        return not match_filter(node.elements[0], attributes)
+
+    values = attributes.get(node.assertion['attr'].lower(), [])
+    if node.tag == MATCH_PRESENT:
+        return bool(values)
+    if node.tag == MATCH_SUBSTRING:
+        parts = ([node.assertion.get('initial', b'')] + node.assertion.get('any', [])
+                 + [node.assertion.get('final', b'')])
+        pattern = '.*'.join(re.escape(assertion_value(part)) for part in parts)
+        return any(re.fullmatch(pattern, value, re.DOTALL) for value in values)
+
+    expected = assertion_value(node.assertion['value'])
+    if node.tag == MATCH_GREATER_OR_EQUAL:
+        return any(value >= expected for value in values)
+    if node.tag == MATCH_LESS_OR_EQUAL:
+        return any(value <= expected for value in values)
+    return expected in values
+
+
+def entry_attributes(entry) -> EntryAttributes:
+    """
+    Normalize the attributes of a ldap3 entry for match_filter.
+    """
+    return {name.lower(): [str(value).lower() for value in values]
+            for name, values in entry.entry_attributes_as_dict.items()}
+
+# pylint: disable=R0902
 class LDAPAuthProvider(LoginProvider, provider_name="LDAP"):
     """
     Login Provider with connection to LDAP Server
@@ -29,12 +125,20 @@ class LDAPAuthProvider(LoginProvider, provider_name="LDAP"):
     consumer_group_filter: str #A consumer must be in at least one of the matched groups
     kiosk_user_group_filter: str #A kiosk user must be in at least one of the matched groups
     admin_group_filter: str # A admin must be in at least one of the matched groups
+    bind_dn: str # The service account used for searches. Empty to search with the connection of the user.
+    bind_password: str # The password of the service account.
+    client_strategy: str # The ldap3 client strategy.
 
     server: Server = None
-
-    admins: List[str] = []
-    kiosk_users: List[str] = []
-    consumers: List[str] = []
+    pool: LDAPConnectionPool = None
+    roles: RoleCache # The roles of all users with a recent login or token refresh
+    # Set up by init from the filters above
+    user_filter_template: Tuple[str, str] = None # Prefix and suffix of the user search filter
+    group_filter_template: Tuple[str, str] = None # Prefix and suffix of the group search filter
+    login_group_filter: Optional[FilterNode] = None # A user must be in at least one matching group
+    role_filters: List[Tuple[Optional[FilterNode], Optional[FilterNode]]] = None # (user, group) filter per role
+    user_attributes: List[str] = None # The attributes of the user entries used by the filters
+    group_attributes: List[str] = None # The attributes of the group entries used by the filters
 
     def __init__(self):
         self.ldap_uri: str = APP.config["LDAP_URI"] #The URL of the ldpa server
@@ -57,12 +161,78 @@ class LDAPAuthProvider(LoginProvider, provider_name="LDAP"):
         self.kiosk_user_group_filter: str = APP.config["LDAP_KIOSK_USER_GROUP_FILTER"]
          # A admin must be in at least one of the matched groups
         self.admin_group_filter: str = APP.config["LDAP_ADMIN_GROUP_FILTER"]
+        self.bind_dn: str = APP.config["LDAP_BIND_DN"] # The service account used for searches.
+        self.bind_password: str = APP.config["LDAP_BIND_PASSWORD"] # The password of the service account.
+        self.client_strategy: str = APP.config["LDAP_CLIENT_STRATEGY"] # The ldap3 client strategy.
 
         self.server: Server = None
-        self.known_users = {}
+        self.pool: LDAPConnectionPool = None
+        self.roles: RoleCache = RoleCache(APP.config["LDAP_ROLE_CACHE_SIZE"], APP.config["LDAP_ROLE_CACHE_TTL"])
+        self.user_filter_template: Tuple[str, str] = None
+        self.group_filter_template: Tuple[str, str] = None
+        self.login_group_filter: Optional[FilterNode] = None
+        self.role_filters: List[Tuple[Optional[FilterNode], Optional[FilterNode]]] = None
+        self.user_attributes: List[str] = None
+        self.group_attributes: List[str] = None
 
     def init(self) -> None:
         self.server = Server(self.ldap_uri, port=self.port, use_ssl=self.ssl)
+        if self.bind_dn:
+            health_check_base = self.user_search_base if APP.config["LDAP_POOL_HEALTH_CHECK"] else None
+            self.pool = LDAPConnectionPool(self.service_connection,
+                                           size=APP.config["LDAP_POOL_SIZE"],
+                                           idle_timeout=APP.config["LDAP_POOL_IDLE_TIMEOUT"],
+                                           health_check_base=health_check_base,
+                                           checkout_timeout=APP.config["LDAP_POOL_CHECKOUT_TIMEOUT"])
+
+        user_role_filters = [self.consumer_filter, self.kiosk_user_filter, self.admin_filter]
+        group_role_filters = [self.consumer_group_filter, self.kiosk_user_group_filter, self.admin_group_filter]
+        all_groups_filter = self.combine_filters(group_role_filters)
+
+        # The user search only finds users matching at least one user filter.
+        self.user_filter_template = self.filter_template(self.combine_filters(user_role_filters), self.user_rdn)
+        # A role without group filter only requires membership in any group, so then all groups are needed.
+        self.group_filter_template = self.filter_template(all_groups_filter if all(group_role_filters) else "",
+                                                          self.group_membership_field)
+        # A user must be in at least one group matching any group filter.
+        self.login_group_filter = compile_filter(all_groups_filter)
+        # (user filter, group filter) for consumers, kiosk users and admins
+        self.role_filters = [(compile_filter(user_filter), compile_filter(group_filter))
+                             for user_filter, group_filter in zip(user_role_filters, group_role_filters)]
+        self.user_attributes = sorted({self.user_uid_field}.union(*(filter_attributes(user_filter)
+                                                                     for user_filter, _ in self.role_filters)))
+        self.group_attributes = sorted(set().union(*(filter_attributes(group_filter)
+                                                     for _, group_filter in self.role_filters)))
+
+    def connect(self, user: str, password: str) -> Connection:
+        """
+        Open a new connection bound with the given credentials.
+
+        Raises:
+            LDAPBindError -- If the credentials are invalid
+        """
+        mock = self.client_strategy in (MOCK_SYNC, MOCK_ASYNC)
+        conn = Connection(self.server,
+                          user=user,
+                          password=password,
+                          # the mock strategies of ldap3 neither support StartTLS nor bind automatically
+                          auto_bind=AUTO_BIND_NONE if mock else AUTO_BIND_TLS_BEFORE_BIND,
+                          client_strategy=self.client_strategy,
+                          read_only=True)
+        if mock and not conn.bind():
+            raise LDAPBindError('automatic bind not successful')
+        return conn
+
+    def service_connection(self) -> Connection:
+        """
+        Open a new connection for the pool, bound as service account.
+        """
+        try:
+            return self.connect(self.bind_dn, self.bind_password or None)
+        except LDAPSocketOpenError as error:
+            raise ConnectionError("Unable to connect to LDAP Server.") from error
+        except LDAPBindError as error:
+            raise ConnectionError("Unable to bind to LDAP Server with the service account.") from error
 
     def valid_user(self, user_id: str) -> bool:
         return True
@@ -81,121 +251,129 @@ class LDAPAuthProvider(LoginProvider, provider_name="LDAP"):
         else:
             return "(|" + ''.join(non_empty_filters) + ")"
 
+    @classmethod
+    def filter_template(cls, role_filter: str, field: str) -> Tuple[str, str]:
+        """
+        Get the prefix and suffix of a filter, which matches role_filter and field = value.
+
+        The escaped value must be inserted between prefix and suffix.
+        """
+        if role_filter:
+            return "(&" + role_filter + "(" + field + "=", "))"
+        return "(" + field + "=", ")"
+
     def valid_password(self, user_id: str, password: str) -> bool:
         try:
-            user_str = self.user_rdn + "=" + user_id + "," + self.user_search_base
-            with Connection(self.server,
-                            user=user_str,
-                            password=password,
-                            auto_bind=AUTO_BIND_TLS_BEFORE_BIND,
-                            read_only=True) as conn:
-
-                user_base_filter = "(" + self.user_rdn + "=" + user_id + ")"
-                user_filter = user_base_filter
-                all_users_filter = self.combine_filters([self.consumer_filter, self.kiosk_user_filter, self.admin_filter])
-
-                if all_users_filter:
-                    user_filter = "(&" + all_users_filter + user_base_filter + ")"
-
-                if not conn.search(self.user_search_base,
-                                   user_filter,
-                                   search_scope=SUBTREE,
-                                   attributes=[self.user_uid_field]):
-                    AUTH_LOGGER.info("User %s is not in the user filter", user_id)
-                    return False
-
-                user_uid = str(conn.entries.pop()[self.user_uid_field])
-
-                group_base_filter = "(" + self.group_membership_field + "=" + user_uid + ")"
-                group_filter = group_base_filter
-                all_groups_filter = self.combine_filters([self.consumer_group_filter, self.kiosk_user_group_filter, self.admin_group_filter])
-
-                if all_groups_filter:
-                    group_filter = "(&" + all_groups_filter + group_base_filter + ")"
-
-                if not conn.search(self.group_search_base, group_filter, search_scope=SUBTREE):
-                    AUTH_LOGGER.info("User %s is not in any group of the group filter", user_id)
-                    return False
-
-                consumer_user_filter = user_base_filter
-                all_consumer_users_filter = self.combine_filters([self.consumer_filter])
-                if all_consumer_users_filter:
-                    consumer_user_filter = "(&" + all_consumer_users_filter + user_base_filter + ")"
-
-                consumer_group_filter = group_base_filter
-                all_consumer_groups_filter = self.combine_filters([self.consumer_group_filter])
-                if all_consumer_groups_filter:
-                    consumer_group_filter = "(&" + all_consumer_groups_filter + group_base_filter + ")"
-
-                in_consumer_user_filter = conn.search(self.user_search_base,
-                                                      consumer_user_filter,
-                                                      search_scope=SUBTREE)
-                in_consumer_group_filter = conn.search(self.group_search_base,
-                                                       consumer_group_filter,
-                                                       search_scope=SUBTREE)
-                if (in_consumer_user_filter and in_consumer_group_filter):
-                    self.consumers.append(user_id)
-
-                kiosk_user_user_filter = user_base_filter
-                all_kiosk_user_users_filter = self.combine_filters([self.kiosk_user_filter])
-                if all_kiosk_user_users_filter:
-                    kiosk_user_user_filter = "(&" + all_kiosk_user_users_filter + user_base_filter + ")"
-
-                kiosk_user_group_filter = group_base_filter
-                all_kiosk_user_groups_filter = self.combine_filters([self.kiosk_user_group_filter])
-                if all_kiosk_user_groups_filter:
-                    kiosk_user_group_filter = "(&" + all_kiosk_user_groups_filter + group_base_filter + ")"
-
-                in_kiosk_user_user_filter = conn.search(self.user_search_base,
-                                                        kiosk_user_user_filter,
-                                                        search_scope=SUBTREE)
-                in_kiosk_user_group_filter = conn.search(self.group_search_base,
-                                                         kiosk_user_group_filter,
-                                                         search_scope=SUBTREE)
-                if (in_kiosk_user_user_filter and in_kiosk_user_group_filter):
-                    self.kiosk_users.append(user_id)
-
-                admin_user_filter = user_base_filter
-                all_admin_users_filter = self.combine_filters([self.admin_filter])
-                if all_admin_users_filter:
-                    admin_user_filter = "(&" + all_admin_users_filter + user_base_filter + ")"
-
-                admin_group_filter = group_base_filter
-                all_admin_groups_filter = self.combine_filters([self.admin_group_filter])
-                if all_admin_groups_filter:
-                    admin_group_filter = "(&" + all_admin_groups_filter + group_base_filter + ")"
-
-                in_admin_user_filter = conn.search(self.user_search_base,
-                                                   admin_user_filter,
-                                                   search_scope=SUBTREE)
-                in_admin_group_filter = conn.search(self.group_search_base,
-                                                    admin_group_filter,
-                                                    search_scope=SUBTREE)
-                if (in_admin_user_filter and in_admin_group_filter):
-                    self.admins.append(user_id)
-
-                AUTH_LOGGER.debug('Valid login from user %s. '
-                                  'User in consumer user filter: %s. User in consumer group: %s. '
-                                  'User in kiosk_user user filter: %s. User in kiosk_user group: %s. '
-                                  'User in admin filter: %s. User in admin group: %s"',
-                                  user_id,
-                                  str(in_consumer_user_filter), str(in_consumer_group_filter),
-                                  str(in_kiosk_user_user_filter), str(in_kiosk_user_group_filter),
-                                  str(in_admin_user_filter), str(in_admin_group_filter))
-
-                return True
-
+            user_str = self.user_rdn + "=" + escape_rdn(user_id) + "," + self.user_search_base
+            # with a service account the bind with the users credentials only checks the password
+            conn = self.connect(user_str, password)
         except LDAPSocketOpenError as error:
             raise ConnectionError("Unable to connect to LDAP Server.") from error
         except LDAPBindError:
             return False
-        return False
 
+        try:
+            return self.cached_roles(user_id, None if self.bind_dn else conn) is not None
+        finally:
+            conn.unbind()
+
+    def cached_roles(self, user_id: str, user_conn: Optional[Connection] = None) -> Optional[FrozenSet[str]]:
+        """
+        Get the roles of a user from the cache, searching and caching them if they are not cached.
+
+        Without a service account the roles can only be searched with the connection of the user
+        (user_conn), i.e. at login. Counts one hit or miss of the cache. Returns None if the user may not login.
+        """
+        roles = self.roles.get(user_id)
+        if roles is None and (self.bind_dn or user_conn is not None):
+            roles = self.search_roles(user_id, user_conn)
+            if roles is not None:
+                self.roles.set(user_id, roles)
+        return roles
+
+    def search_roles(self, user_id: str, user_conn: Optional[Connection] = None) -> Optional[FrozenSet[str]]:
+        """
+        Search the roles of a user with the given connection or a service connection from the pool.
+
+        Returns None if the user may not login.
+        """
+        try:
+            if user_conn is not None:
+                entries = self.search_entries(user_conn, user_id)
+            else:
+                with self.pool.connection() as conn:
+                    entries = self.search_entries(conn, user_id)
+        except LDAPSocketOpenError as error:
+            raise ConnectionError("Unable to connect to LDAP Server.") from error
+
+        if entries is None:
+            AUTH_LOGGER.info("User %s is not in the user filter", user_id)
+            return None
+        user, groups = entries
+
+        if not any(match_filter(self.login_group_filter, group) for group in groups):
+            AUTH_LOGGER.info("User %s is not in any group of the group filter", user_id)
+            return None
+
+        in_user_filter = [match_filter(user_filter, user) for user_filter, _ in self.role_filters]
+        in_group = [any(match_filter(group_filter, group) for group in groups) for _, group_filter in self.role_filters]
+
+        AUTH_LOGGER.debug('Searched roles of user %s. '
+                          'User in consumer user filter: %s. User in consumer group: %s. '
+                          'User in kiosk_user user filter: %s. User in kiosk_user group: %s. '
+                          'User in admin filter: %s. User in admin group: %s"',
+                          user_id,
+                          str(in_user_filter[0]), str(in_group[0]),
+                          str(in_user_filter[1]), str(in_group[1]),
+                          str(in_user_filter[2]), str(in_group[2]))
+
+        return frozenset(role for role, in_user, in_role_group
+                         in zip((CONSUMER, KIOSK_USER, ADMIN), in_user_filter, in_group)
+                         if in_user and in_role_group)
+
+    def search_entries(self, conn: Connection, user_id: str) -> Optional[Tuple[EntryAttributes, List[EntryAttributes]]]:
+        """
+        Search the user entry and the groups of the user. Returns None if the user is not in the user filter.
+        """
+        prefix, suffix = self.user_filter_template
+        if not conn.search(self.user_search_base,
+                           prefix + escape_filter_chars(user_id) + suffix,
+                           search_scope=SUBTREE,
+                           attributes=self.user_attributes):
+            return None
+
+        user_entry = conn.entries[0]
+        user_uid = str(user_entry[self.user_uid_field])
+        user = entry_attributes(user_entry)
+
+        prefix, suffix = self.group_filter_template
+        conn.search(self.group_search_base,
+                    prefix + escape_filter_chars(user_uid) + suffix,
+                    search_scope=SUBTREE,
+                    attributes=self.group_attributes)
+        return user, [entry_attributes(entry) for entry in conn.entries]
+
+    # The role checks follow valid_password or current_role, which already counted the lookup.
     def is_admin(self, user_id: str) -> bool:
-        return user_id in self.admins
+        return ADMIN in self.roles.peek(user_id)
 
     def is_kiosk_user(self, user_id: str) -> bool:
-        return user_id in self.kiosk_users
+        return KIOSK_USER in self.roles.peek(user_id)
 
     def is_consuming_user(self, user_id: str) -> bool:
-        return user_id in self.consumers
+        return CONSUMER in self.roles.peek(user_id)
+
+    def current_role(self, user_id: str) -> Optional[UserRole]:
+        if self.cached_roles(user_id) is None:
+            return None
+        return super().current_role(user_id)
+
+    def role_cache_stats(self) -> Optional[Dict[str, float]]:
+        return self.roles.stats()
+
+    def flush_user(self, user_id: str) -> bool:
+        return self.roles.invalidate(user_id)
+
+    def close_connections(self) -> None:
+        if self.pool is not None:
+            self.pool.clear()
@@ -0,0 +1,109 @@
+"""
+Bounded pool of reusable LDAP connections.
+"""
+
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from ldap3 import Connection, BASE
+from ldap3.core.exceptions import LDAPException
+
+from .. import AUTH_LOGGER
+
+
+# pylint: disable=R0902
+class LDAPConnectionPool():
+    """
+    Pool of at most size bound connections created by connection_factory.
+
+    Idle connections are closed after idle_timeout seconds. If health_check_base is set,
+    every connection is checked with a base search on this dn before it is handed out.
+    """
+
+    # pylint: disable=R0913
+    def __init__(self, connection_factory: Callable[[], Connection], size: int, idle_timeout: float,
+                 health_check_base: Optional[str] = None, checkout_timeout: Optional[float] = None):
+        self.connection_factory = connection_factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_base = health_check_base
+        self.checkout_timeout = checkout_timeout
+        self._slots = BoundedSemaphore(size)
+        self._lock = Lock()
+        self._idle: List[Tuple[Connection, float]] = []
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """
+        Context manager to borrow a connection from the pool.
+
+        The connection is returned to the pool afterwards, or closed if an exception occured.
+
+        Raises:
+            ConnectionError -- If no connection becomes available within checkout_timeout
+        """
+        timeout = -1 if self.checkout_timeout is None else self.checkout_timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise ConnectionError('No LDAP connection available.')
+        try:
+            conn = self._checkout()
+            try:
+                yield conn
+            except BaseException:
+                self._close(conn)
+                raise
+            with self._lock:
+                self._idle.append((conn, monotonic()))
+        finally:
+            self._slots.release()
+
+    def clear(self):
+        """
+        Close all idle connections, e.g. after a configuration change or fork.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _checkout(self) -> Connection:
+        """
+        Get a healthy idle connection or create a new one.
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                # most recently used first, so surplus connections can reach the idle timeout
+                conn, last_used = self._idle.pop()
+            if monotonic() - last_used > self.idle_timeout or not self._healthy(conn):
+                self._close(conn)
+                continue
+            return conn
+        return self.connection_factory()
+
+    def _healthy(self, conn: Connection) -> bool:
+        """
+        Check if the connection can still be used.
+        """
+        if conn.closed or not conn.bound:
+            return False
+        if self.health_check_base:
+            try:
+                conn.search(self.health_check_base, '(objectClass=*)', search_scope=BASE, attributes=[])
+            except LDAPException as error:
+                AUTH_LOGGER.info('Discarding broken LDAP connection: %s', error)
+                return False
+        return True
+
+    @staticmethod
+    def _close(conn: Connection):
+        """
+        Close a connection, ignoring errors of already broken connections.
+        """
+        try:
+            conn.unbind()
+        except LDAPException:
+            pass
@@ -0,0 +1,79 @@
+"""
+Bounded cache for the roles of users with an expiry time.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+
+class RoleCache():
+    """
+    LRU cache of user name -> set of roles.
+
+    At most max_size users are cached, entries expire ttl seconds after they were set.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: 'OrderedDict[str, Tuple[FrozenSet[str], float]]' = OrderedDict()
+
+    def set(self, user_id: str, roles: Iterable[str]):
+        """
+        Set the roles of a user, evicting the least recently used user if the cache is full.
+        """
+        with self._lock:
+            self._entries[user_id] = (frozenset(roles), monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id: str) -> Optional[FrozenSet[str]]:
+        """
+        Get the roles of a user or None if the user is not cached or the entry expired.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, user_id: str) -> FrozenSet[str]:
+        """
+        Get the roles of a user like get, but without counting a hit or miss. Empty if the user is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < monotonic():
+                return frozenset()
+            return entry[0]
+
+    def invalidate(self, user_id: str) -> bool:
+        """
+        Remove a user from the cache. Returns whether the user was cached.
+        """
+        with self._lock:
+            return self._entries.pop(user_id, None) is not None
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the size and hit/miss statistics of the cache.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,107 @@
+"""
+Load tests simulating kiosk traffic.
+
+The flask bench command creates benchmark accounts and beverages in an empty database
+(a temporary SQLite database by default), runs a weighted mix of logins, beverage polls,
+purchases, cancellations and history reads and reports throughput and latency percentiles
+per endpoint as json. Requires the Basic login provider to be enabled.
+
+The flask bench_startup command measures the import time and the latency of the first
+requests of freshly started processes.
+"""
+
+import json
+from random import Random
+from tempfile import TemporaryDirectory
+from typing import Dict
+
+import click
+from sqlalchemy.engine.url import make_url
+
+from .. import APP, DB
+from .runner import ForkedServer, HTTPTransport, LocalServer, TestClientTransport, run
+from .scenarios import DEFAULT_WEIGHTS, KioskTraffic, register_accounts, user_names
+from .startup import measure_startup, summarize
+
+
+def parse_weights(value: str) -> Dict[str, int]:
+    """
+    Parse scenario weights like "purchase=5,cancel=1" on top of the default weights.
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, value.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_WEIGHTS or not weight.isdigit():
+            raise click.BadParameter('Expected scenario=weight with a scenario out of {}.'
+                                     .format(', '.join(DEFAULT_WEIGHTS)))
+        weights[name] = int(weight)
+    return weights
+
+
+@APP.cli.command('bench')
+@click.option('--requests', type=click.IntRange(1), default=1000, help='Number of scenarios to run.')
+@click.option('--concurrency', type=click.IntRange(1), default=1, help='Number of concurrent clients.')
+@click.option('--users', type=click.IntRange(1), default=20, help='Number of consuming users.')
+@click.option('--beverages', type=click.IntRange(1), default=10, help='Number of beverages.')
+@click.option('--weights', default='', help='Scenario weights, e.g. "purchase=5,cancel=1".')
+@click.option('--seed', type=int, default=0, help='Seed of the random traffic.')
+@click.option('--server', is_flag=True, help='Send HTTP requests to a local WSGI server instead of using the test client.')
+@click.option('--workers', type=click.IntRange(0), default=0,
+              help='Run the --server with this many preforked workers (like flask serve) instead of the '
+                   'threaded development server (like flask run).')
+@click.option('--database', default=None, help='URI of an empty database, defaults to a temporary SQLite database.')
+@click.option('--output', type=click.File('w'), default='-', help='Output file for the json report, defaults to stdout.')
+# pylint: disable=R0913
+def bench(requests: int, concurrency: int, users: int, beverages: int, weights: str, seed: int,
+          server: bool, workers: int, database: str, output):
+    """Run a load test with simulated kiosk traffic."""
+    weights = parse_weights(weights)
+    register_accounts(user_names(users))
+    with TemporaryDirectory() as directory:
+        APP.config['SQLALCHEMY_DATABASE_URI'] = database or 'sqlite:///{}/bench.db'.format(directory)
+        DB.create_all()
+        if server:
+            with (ForkedServer(APP, workers) if workers else LocalServer(APP)) as local_server:
+                report = run_benchmark(lambda: HTTPTransport(local_server.base_url), requests, concurrency,
+                                       users, beverages, weights, seed)
+        else:
+            report = run_benchmark(lambda: TestClientTransport(APP), requests, concurrency,
+                                   users, beverages, weights, seed)
+        DB.session.remove()
+        DB.get_engine().dispose()
+    report['config'] = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'users': users,
+        'beverages': beverages,
+        'weights': weights,
+        'seed': seed,
+        'transport': ('prefork' if workers else 'server') if server else 'test_client',
+        'workers': workers if server else 0,
+        'database': make_url(database).get_backend_name() if database else 'sqlite',
+    }
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+# pylint: disable=R0913
+def run_benchmark(transport_factory, requests: int, concurrency: int, users: int, beverages: int,
+                  weights: Dict[str, int], seed: int) -> dict:
+    """
+    Set up the benchmark data and run the scenarios.
+    """
+    traffic = KioskTraffic.setup(transport_factory(), users, beverages, Random(seed))
+    return run(transport_factory, traffic.scenarios(), weights, requests, concurrency, seed)
+
+
+@APP.cli.command('bench_startup')
+@click.option('--runs', type=click.IntRange(1), default=5, help='Number of started processes.')
+@click.option('--path', default='/', help='Path of the first requests.')
+@click.option('--packages', type=click.IntRange(0), default=10, help='Number of slowest imported packages to report.')
+@click.option('--output', type=click.File('w'), default='-', help='Output file for the json report, defaults to stdout.')
+def bench_startup(runs: int, path: str, packages: int, output):
+    """Measure the import time and first request latency of new processes."""
+    report = summarize([measure_startup(path) for _ in range(runs)], packages)
+    report['config'] = {'runs': runs, 'path': path}
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.write('\n')
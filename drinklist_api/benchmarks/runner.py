@@ -0,0 +1,238 @@
+"""
+Transports and the runner of the load tests.
+"""
+
+import json
+import os
+import signal
+from math import ceil
+from random import Random
+from threading import Thread
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from flask import Flask
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from ..server import PreforkServer
+
+
+class Transport():
+    """
+    Sends requests to the app and returns status code, headers and body.
+    """
+
+    def request(self, method: str, path: str, payload=None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class TestClientTransport(Transport):
+    """
+    Transport using the flask test client, which calls the app in process.
+    """
+
+    def __init__(self, app: Flask):
+        self.client = app.test_client()
+
+    def request(self, method, path, payload=None, headers=None):
+        response = self.client.open(path, method=method, json=payload, headers=headers)
+        return response.status_code, dict(response.headers), response.get_data()
+
+
+class HTTPTransport(Transport):
+    """
+    Transport sending real HTTP requests to a server.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def request(self, method, path, payload=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        request = Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urlopen(request) as response:
+                return response.status, dict(response.headers), response.read()
+        except HTTPError as error:
+            return error.code, dict(error.headers), error.read()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    Request handler which does not log every request.
+    """
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class LocalServer():
+    """
+    Werkzeug WSGI server for the app on a free local port, running in a background thread.
+    """
+
+    def __init__(self, app: Flask):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+
+
+class ForkedServer():
+    """
+    Preforking server for the app on a free local port, supervised by a forked process.
+    """
+
+    def __init__(self, app: Flask, workers: int):
+        self.server = PreforkServer(app, '127.0.0.1', 0, workers, request_handler=QuietRequestHandler)
+        self.pid: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self.server.port)
+
+    def __enter__(self):
+        self.pid = os.fork()
+        if not self.pid:
+            try:
+                self.server.serve()
+            finally:
+                os._exit(0)  # pylint: disable=W0212
+        self.server.socket.close()
+        return self
+
+    def __exit__(self, *args):
+        os.kill(self.pid, signal.SIGTERM)
+        os.waitpid(self.pid, 0)
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+class Results():
+    """
+    Latencies and errors of all executed requests, grouped by label.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, label: str, latency: float, error: bool):
+        self.latencies.setdefault(label, []).append(latency)
+        self.errors[label] = self.errors.get(label, 0) + int(error)
+
+    def merge(self, other: 'Results'):
+        for label, latencies in other.latencies.items():
+            self.latencies.setdefault(label, []).extend(latencies)
+            self.errors[label] = self.errors.get(label, 0) + other.errors[label]
+
+    def report(self, duration: float) -> dict:
+        """
+        Summarize the results as json serializable dict. Latencies are in milliseconds.
+        """
+        endpoints = {}
+        for label, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            endpoints[label] = {
+                'requests': len(latencies),
+                'errors': self.errors[label],
+                'throughput': round(len(latencies) / duration, 2),
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'duration_s': round(duration, 3),
+            'throughput': round(total / duration, 2) if duration else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+class Client():
+    """
+    Sends requests with a transport and records their latencies in results.
+    """
+
+    def __init__(self, transport: Transport, results: Results):
+        self.transport = transport
+        self.results = results
+
+    def call(self, label: str, method: str, path: str, payload=None, headers: Optional[Dict[str, str]] = None,
+             expected: Tuple[int, ...] = (200,)) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send a request and record its latency under label.
+
+        Requests with a status code not in expected are counted as errors.
+        """
+        start = perf_counter()
+        status, response_headers, body = self.transport.request(method, path, payload, headers)
+        self.results.record(label, perf_counter() - start, status not in expected)
+        return status, response_headers, body
+
+
+Scenario = Callable[[Client, Random], None]
+
+
+def run_worker(client: Client, scenarios: Dict[str, Scenario], weights: Dict[str, int], requests: int, seed: int):
+    """
+    Execute the given number of randomly chosen scenarios.
+    """
+    rng = Random(seed)
+    names = [name for name in scenarios if weights.get(name, 0) > 0]
+    name_weights = [weights[name] for name in names]
+    for _ in range(requests):
+        scenarios[rng.choices(names, name_weights)[0]](client, rng)
+
+
+def run(transport_factory: Callable[[], Transport], scenarios: Dict[str, Scenario], weights: Dict[str, int],
+        requests: int, concurrency: int, seed: int) -> dict:
+    """
+    Run the given number of scenarios distributed over concurrency threads and report the results.
+    """
+    clients = [Client(transport_factory(), Results()) for _ in range(concurrency)]
+    threads = [Thread(target=run_worker,
+                      args=(client, scenarios, weights, requests // concurrency + (i < requests % concurrency),
+                            seed + i))
+               for i, client in enumerate(clients)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = perf_counter() - start
+
+    results = Results()
+    for client in clients:
+        client.transport.close()
+        results.merge(client.results)
+    return results.report(duration)
@@ -0,0 +1,145 @@
+"""
+Scenarios modelling the traffic of kiosks using the API.
+"""
+
+import json
+from collections import deque
+from random import Random
+from typing import Deque, Dict, List, Tuple
+
+from .. import APP
+from .runner import Client, Scenario, Transport
+
+DEFAULT_WEIGHTS: Dict[str, int] = {
+    'login': 2,
+    'beverage_poll': 10,
+    'purchase': 5,
+    'cancel': 1,
+    'history': 2,
+}
+
+PASSWORD = 'bench'
+ADMIN = 'bench-admin'
+KIOSK = 'bench-kiosk'
+
+
+def user_names(users: int) -> List[str]:
+    """
+    Names of the consuming benchmark accounts.
+    """
+    return ['bench-user-{}'.format(i) for i in range(users)]
+
+
+def register_accounts(users: List[str]):
+    """
+    Register the benchmark accounts with the Basic login provider.
+
+    Must be called before the server forks its workers.
+    """
+    APP.config['BASIC_AUTH_USERS'].update({name: PASSWORD for name in users + [ADMIN, KIOSK]})
+    APP.config['BASIC_AUTH_ADMIN'].append(ADMIN)
+    APP.config['BASIC_AUTH_KIOSK'].append(KIOSK)
+    APP.config['BASIC_AUTH_USER'].extend(users)
+
+
+def login(transport: Transport, name: str) -> str:
+    """
+    Login with a benchmark account and return the access token.
+    """
+    status, _, body = transport.request('POST', '/auth/login/', {'username': name, 'password': PASSWORD})
+    if status != 200:
+        raise RuntimeError('Login of {} failed with status {}, is the Basic login provider enabled?'
+                           .format(name, status))
+    return json.loads(body)['access_token']
+
+
+class KioskTraffic():
+    """
+    Shared state of the scenarios: accounts, beverages and purchases which can be canceled.
+    """
+
+    def __init__(self, users: List[str], beverage_ids: List[int], kiosk_token: str, admin_token: str):
+        self.users = users
+        self.beverage_ids = beverage_ids
+        self.kiosk_headers = {'Authorization': 'Bearer ' + kiosk_token}
+        self.admin_headers = {'Authorization': 'Bearer ' + admin_token}
+        self.etag = ''
+        # deque append and popleft are thread safe
+        self.purchases: Deque[Tuple[str, int]] = deque()
+
+    @classmethod
+    def setup(cls, transport: Transport, users: int, beverages: int, rng: Random) -> 'KioskTraffic':
+        """
+        Create the beverages of the benchmark through the API and log the accounts in.
+
+        The accounts must have been registered with register_accounts before.
+        """
+        admin_token = login(transport, ADMIN)
+        admin_headers = {'Authorization': 'Bearer ' + admin_token}
+        beverage_ids = []
+        for i in range(beverages):
+            payload = {'name': 'bench-beverage-{}'.format(i), 'price': rng.randint(50, 250), 'stock': 10000}
+            status, _, body = transport.request('POST', '/beverages/', payload, admin_headers)
+            if status != 201:
+                raise RuntimeError('Creating a beverage failed with status {}.'.format(status))
+            beverage_ids.append(json.loads(body)['id'])
+        # the first login of a consuming user creates it
+        names = user_names(users)
+        for name in names:
+            login(transport, name)
+        return cls(names, beverage_ids, login(transport, KIOSK), admin_token)
+
+    def scenarios(self) -> Dict[str, Scenario]:
+        return {
+            'login': self.login,
+            'beverage_poll': self.beverage_poll,
+            'purchase': self.purchase,
+            'cancel': self.cancel,
+            'history': self.history,
+        }
+
+    def login(self, client: Client, rng: Random):
+        """
+        A user logs in at a kiosk.
+        """
+        client.call('login', 'POST', '/auth/login/', {'username': rng.choice(self.users), 'password': PASSWORD})
+
+    def beverage_poll(self, client: Client, rng: Random):
+        """
+        A kiosk refreshes its beverage list with a conditional request.
+        """
+        headers = dict(self.kiosk_headers, **{'If-None-Match': self.etag})
+        status, headers, _ = client.call('beverage_poll', 'GET', '/beverages/', headers=headers, expected=(200, 304))
+        if status == 200:
+            self.etag = headers.get('ETag', '')
+
+    def purchase(self, client: Client, rng: Random):
+        """
+        A user buys one to three different beverages.
+        """
+        user = rng.choice(self.users)
+        beverages = [{'beverage': {'id': beverage_id}, 'count': -rng.randint(1, 2)}
+                     for beverage_id in rng.sample(self.beverage_ids, rng.randint(1, min(3, len(self.beverage_ids))))]
+        status, _, body = client.call('purchase', 'POST', '/users/{}/transactions/'.format(user),
+                                      {'beverages': beverages, 'amount': 0, 'reason': 'bench'},
+                                      self.kiosk_headers, expected=(201,))
+        if status == 201:
+            self.purchases.append((user, json.loads(body)['id']))
+
+    def cancel(self, client: Client, rng: Random):
+        """
+        A user cancels a previous purchase, buying something first if nothing is left to cancel.
+        """
+        try:
+            user, transaction_id = self.purchases.popleft()
+        except IndexError:
+            self.purchase(client, rng)
+            return
+        client.call('cancel', 'DELETE', '/users/{}/transactions/{}/'.format(user, transaction_id),
+                    {'reason': 'bench'}, self.kiosk_headers, expected=(201,))
+
+    def history(self, client: Client, rng: Random):
+        """
+        An admin reads the newest page of the transaction history.
+        """
+        client.call('history', 'GET', '/history/?limit=100', headers=self.admin_headers)
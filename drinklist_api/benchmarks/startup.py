@@ -0,0 +1,79 @@
+"""
+Measurement of the cold start of the app in fresh interpreter processes.
+
+Every run imports the WSGI entry point like a newly started worker, sends the first requests
+with the test client and reports the time spent in the imports of every top-level package.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+from typing import Dict, List
+
+# executed in the measured process, prints the timings as json
+STARTUP_SCRIPT = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+from drinklist_api.wsgi import application
+timings = {'import_s': perf_counter() - start}
+client = application.test_client()
+for name, path in (('first_request_s', sys.argv[1]), ('second_request_s', sys.argv[1]), ('swagger_s', '/swagger.json')):
+    start = perf_counter()
+    client.get(path)
+    timings[name] = perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def package_import_times(importtime_output: str) -> Dict[str, float]:
+    """
+    Sum the self times of the output of python -X importtime per top-level package.
+    """
+    times: Dict[str, float] = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        if not self_time.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        times[package] = times.get(package, 0.0) + int(self_time) / 1e6
+    return times
+
+
+def measure_startup(path: str) -> Dict[str, float]:
+    """
+    Start a fresh interpreter, import the app and send the first requests.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    # import the app like a WSGI server, not like the flask command running this benchmark
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    start = perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, path],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, check=True,
+                             universal_newlines=True)
+    timings = json.loads(process.stdout.splitlines()[-1])
+    timings['process_s'] = perf_counter() - start
+    timings['packages'] = package_import_times(process.stderr)
+    return timings
+
+
+def summarize(runs: List[Dict[str, float]], packages: int) -> dict:
+    """
+    Minimum, median and maximum of every timing and the median import time of the slowest packages.
+    """
+    report: dict = {}
+    for key in ('process_s', 'import_s', 'first_request_s', 'second_request_s', 'swagger_s'):
+        values = [run[key] for run in runs]
+        report[key] = {'min': min(values), 'median': median(values), 'max': max(values)}
+    package_times = {package: median(run['packages'].get(package, 0.0) for run in runs)
+                     for package in set().union(*(run['packages'] for run in runs))}
+    slowest = sorted(package_times.items(), key=lambda item: item[1], reverse=True)[:packages]
+    report['packages'] = dict(slowest)
+    return report
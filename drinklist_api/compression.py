@@ -0,0 +1,109 @@
+"""
+Module for compressing responses with an encoding negotiated via Accept-Encoding.
+
+Only responses with a mimetype in COMPRESSION_MIMETYPES are compressed. Buffered responses
+smaller than COMPRESSION_MIN_SIZE are sent uncompressed. Streamed responses are compressed
+chunk by chunk while they are sent, so they are never buffered as a whole.
+"""
+
+import zlib
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from flask import request, Response
+
+from . import APP
+
+COMPRESSION_ENCODINGS = APP.config.get('COMPRESSION_ENCODINGS', [])
+
+if 'br' in COMPRESSION_ENCODINGS:
+    # pylint: disable=C0413
+    import brotli
+
+Compressor = Tuple[Callable[[bytes], bytes], Callable[[], bytes]]
+
+
+def gzip_compressor() -> Compressor:
+    """
+    Create the compress and flush functions of a new gzip stream.
+    """
+    compressor = zlib.compressobj(APP.config['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def brotli_compressor() -> Compressor:
+    """
+    Create the compress and flush functions of a new brotli stream.
+    """
+    compressor = brotli.Compressor(quality=APP.config['COMPRESSION_BROTLI_QUALITY'])
+    return compressor.process, compressor.finish
+
+
+COMPRESSORS = {
+    'gzip': gzip_compressor,
+    'br': brotli_compressor,
+}
+
+for encoding in COMPRESSION_ENCODINGS:
+    if encoding not in COMPRESSORS:
+        raise ValueError('Unsupported compression encoding {}, expected one of {}.'
+                         .format(encoding, ', '.join(COMPRESSORS)))
+
+
+def negotiate_encoding() -> Optional[str]:
+    """
+    Choose the encoding with the highest quality in Accept-Encoding, preferring the order of COMPRESSION_ENCODINGS.
+    """
+    accepted = request.accept_encodings
+    qualities = [(accepted.quality(encoding), -index, encoding) for index, encoding in enumerate(COMPRESSION_ENCODINGS)]
+    quality, _, encoding = max(qualities, default=(0, 0, None))
+    return encoding if quality > 0 else None
+
+
+def compress_stream(chunks: Iterator[bytes], body: Iterable, compressor: Compressor) -> Iterator[bytes]:
+    """
+    Compress the encoded chunks of a streamed response body and close the body afterwards.
+    """
+    compress, flush = compressor
+    try:
+        for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield flush()
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+if COMPRESSION_ENCODINGS:
+    @APP.after_request
+    def compress_response(response: Response) -> Response:
+        """
+        Compress the response if the client accepts one of the configured encodings.
+        """
+        if (response.mimetype not in APP.config['COMPRESSION_MIMETYPES']
+                or not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.iter_encoded(), response.response,
+                                                COMPRESSORS[encoding]())
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < APP.config['COMPRESSION_MIN_SIZE']:
+                return response
+            compress, flush = COMPRESSORS[encoding]()
+            response.set_data(compress(data) + flush())
+        response.headers['Content-Encoding'] = encoding
+
+        # the compressed body is a different representation, so a strong etag must not be reused
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
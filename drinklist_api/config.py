@@ -12,7 +12,36 @@ class Config(object):
     JWT_SECRET_KEY = ''.join(hex(randint(0, 255))[2:] for i in range(16))
     SQLALCHEMY_DATABASE_URI = 'sqlite://:memory:'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool of every worker, None for the defaults of Flask-SQLAlchemy and SQLAlchemy.
+    # SQLite files are opened for every session, unless SQLALCHEMY_POOL_SIZE is set.
+    SQLALCHEMY_POOL_SIZE = None  # Idle connections kept open (default 5, 10 for MySQL)
+    SQLALCHEMY_MAX_OVERFLOW = None  # Connections opened beyond the pool size under load (default 10)
+    SQLALCHEMY_POOL_TIMEOUT = None  # Seconds to wait for a connection before failing (default 30)
+    SQLALCHEMY_POOL_RECYCLE = None  # Seconds until a connection is reopened (default 7200 for MySQL, else never)
+    SQLALCHEMY_POOL_PRE_PING = True  # Test connections on checkout and replace stale ones
+    SQLALCHEMY_POOL_SLOW_CHECKOUT = 0.1  # Log waits for a connection longer than this many seconds, None to disable
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # Further keyword arguments of sqlalchemy.create_engine
+
+    # Name of a bind in SQLALCHEMY_BINDS serving the reads of list endpoints, None to read from the primary.
+    READ_REPLICA_BIND = None
+    READ_REPLICA_MAX_LAG = 5  # Seconds the replica may lag behind before reads fall back to the primary
+    READ_REPLICA_CHECK_INTERVAL = 1  # Seconds between two checks of the lag
     DB_UNIQUE_CONSTRAIN_FAIL = 'UNIQUE constraint failed'
+
+    # Pragmas set on every new SQLite connection, None to keep the SQLite default.
+    # In WAL mode synchronous=NORMAL keeps the db consistent, but a power loss may undo the last commits.
+    SQLITE_FOREIGN_KEYS = True
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # Readers and the writer do not block each other
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # Milliseconds to wait for a lock before failing with "database is locked"
+        'mmap_size': 268435456,  # Bytes of the db file read through a memory map
+        'cache_size': -16000,  # Page cache of every connection, in KiB if negative
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_MAINTENANCE_INTERVAL = 600  # Seconds between WAL checkpoints and PRAGMA optimize, None to disable
+    SQLITE_CHECKPOINT_MODE = 'TRUNCATE'  # PASSIVE never waits for readers, TRUNCATE also empties the WAL file
     URI_BASE_PATH = '/'
 
     LOGIN_PROVIDERS = ['Basic']
@@ -37,13 +66,57 @@ class Config(object):
     LDAP_CONSUMER_GROUP_FILTER = ""
     LDAP_KIOSK_USER_GROUP_FILTER = ""
     LDAP_ADMIN_GROUP_FILTER = ""
+    # Service account for the searches. If empty, the roles are searched with the connection of the user at
+    # login, and a token refresh after the cached roles expired requires a new login.
+    LDAP_BIND_DN = ""
+    LDAP_BIND_PASSWORD = ""
+    LDAP_CLIENT_STRATEGY = "SYNC"  # Use "MOCK_SYNC" to test against the ldap3 mock server
+    LDAP_POOL_SIZE = 4
+    LDAP_POOL_IDLE_TIMEOUT = 300  # Seconds until an idle service connection is closed
+    LDAP_POOL_CHECKOUT_TIMEOUT = 10  # Seconds to wait for a free service connection
+    LDAP_POOL_HEALTH_CHECK = False  # Check pooled connections with a search before every use
+    LDAP_ROLE_CACHE_SIZE = 1024  # Maximum number of users whose roles are cached
+    LDAP_ROLE_CACHE_TTL = 3600  # Seconds until the roles of a user are searched again at login or token refresh
 
     LOGGING_CONFIGS = ['logging_config.json']
 
+    METRICS_ENABLED = False  # Requires prometheus_client
+    METRICS_PATH = '/metrics'
+    METRICS_MULTIPROC_DIR = None  # Directory shared by all worker processes to aggregate the metrics
+
+    SQL_SLOW_QUERY_THRESHOLD = 0.5  # Log SQL statements slower than this many seconds, None to disable
+    SQL_STATEMENT_BUDGET = None  # Maximum number of SQL statements per request, None to disable
+    # Budgets for single endpoints, None for no budget. The batch endpoint inserts every transaction separately.
+    SQL_STATEMENT_BUDGETS = {'api.transactions_transaction_batch': None}
+    SQL_STATEMENT_BUDGET_FAIL = False  # Raise an error instead of logging a warning
+
     JSON_SORT_KEYS = False
     JSONIFY_PRETTYPRINT_REGULAR = False
     RESTPLUS_JSON = {'indent': None}
 
+    # Compress responses with the first of these encodings accepted by the client, empty to disable.
+    # 'br' requires the brotli package.
+    COMPRESSION_ENCODINGS = ['gzip']
+    COMPRESSION_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/csv']
+    COMPRESSION_MIN_SIZE = 1024  # Bytes, smaller buffered responses are sent uncompressed
+    COMPRESSION_GZIP_LEVEL = 6  # 1 (fastest) to 9 (smallest)
+    COMPRESSION_BROTLI_QUALITY = 5  # 0 (fastest) to 11 (smallest)
+
+    HISTORY_PAGE_SIZE = 100
+    HISTORY_MAX_PAGE_SIZE = 1000
+
+    EXPORT_BATCH_SIZE = 1000
+
+    # Lock user and beverage rows with SELECT ... FOR UPDATE while handling transactions (MySQL/PostgreSQL)
+    TRANSACTION_ROW_LOCKING = False
+
+    # Seconds a worker may serve its cached beverage list without checking the database
+    BEVERAGE_CACHE_TTL = 5
+
+    # Days of the consumption statistics start at midnight of this timezone (seconds east of UTC).
+    # Run flask rebuild_consumption after changing it.
+    STATISTICS_UTC_OFFSET = 0
+
 class ProductionConfig(Config):
     pass
 
@@ -66,5 +139,9 @@ class DebugConfig(Config):
 
     LOGGING_CONFIGS = ['logging_config.json', 'logging_config_debug.json']
 
+    SQL_STATEMENT_BUDGET = 20
+
 class TestingConfig(Config):
     TESTING = True
+    SQL_STATEMENT_BUDGET = 20
+    SQL_STATEMENT_BUDGET_FAIL = True
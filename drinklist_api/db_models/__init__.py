@@ -1,6 +1,9 @@
+from typing import Any, Dict, List
+
 import click
-from sqlalchemy.engine import Engine
-from sqlalchemy import event
+from sqlalchemy import Table
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.exc import IntegrityError
 
 
 from .. import APP, DB
@@ -8,16 +11,49 @@ from .. import APP, DB
 STD_STRING_SIZE = 190  # Max size that allows Indices while using utf8mb4 in MySql DB
 
 
-from . import beverage, user, transaction, transaction_beverage
+def insert_ignore(table: Table, **values):
+    """
+    Insert a row into the table in the current session, doing nothing if it violates a unique constraint.
+
+    Uses the native insert-or-ignore statement of SQLite, MySQL and PostgreSQL, so concurrent
+    inserts of the same row do not fail.
+    """
+    insert_ignore_many(table, [values])
+
+
+def insert_ignore_many(table: Table, rows: List[Dict[str, Any]]):
+    """
+    Insert rows with one executemany like insert_ignore, skipping rows which violate a unique constraint.
+    """
+    if not rows:
+        return
+    dialect = DB.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        DB.session.execute(postgresql_insert(table).on_conflict_do_nothing(), rows)
+    elif dialect == 'sqlite':
+        DB.session.execute(table.insert().prefix_with('OR IGNORE'), rows)
+    elif dialect == 'mysql':
+        DB.session.execute(table.insert().prefix_with('IGNORE'), rows)
+    else:
+        for values in rows:
+            try:
+                with DB.session.begin_nested():
+                    DB.session.execute(table.insert().values(**values))
+            except IntegrityError:
+                pass
 
 
-if APP.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('sqlite://'):
-    @event.listens_for(Engine, 'connect')
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        if APP.config.get('SQLITE_FOREIGN_KEYS', True):
-            cursor = dbapi_connection.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
+# pylint: disable=C0413
+from . import beverage, user, transaction, transaction_beverage, consumption, instrumentation, replica
+
+# pylint: disable=C0413
+from ..export import EXPORT_FORMATS, export_transactions
+# pylint: disable=C0413
+from ..seed import seed
+# pylint: disable=C0413
+from ..reconcile import balance_drift, stock_drift, fix_drift, rebase_stocks
+# pylint: disable=C0413
+from .sqlite_profile import SQLITE_ENABLED, run_maintenance
 
 
 @APP.cli.command('create_db')
@@ -32,6 +68,77 @@ def create_db_function():
     APP.logger.info('Database created.')
 
 
+@APP.cli.command('seed_db')
+@click.option('--users', type=click.IntRange(0), default=100, help='Number of users to create.')
+@click.option('--beverages', type=click.IntRange(0), default=20, help='Number of beverages to create.')
+@click.option('--transactions', type=click.IntRange(0), default=10000, help='Number of transactions to create.')
+@click.option('--cancel-ratio', type=click.FloatRange(0, 1), default=0.05,
+              help='Share of transactions canceling a previous transaction.')
+@click.option('--deposit-ratio', type=click.FloatRange(0, 1), default=0.1,
+              help='Share of transactions without beverages.')
+@click.option('--days', type=click.IntRange(1), default=365, help='Spread the transactions over the last days.')
+@click.option('--batch-size', type=click.IntRange(1), default=10000, help='Rows per bulk insert.')
+@click.option('--seed', 'seed_value', type=int, default=0, help='Seed of the random data.')
+# pylint: disable=R0913
+def seed_db(users: int, beverages: int, transactions: int, cancel_ratio: float, deposit_ratio: float,
+            days: int, batch_size: int, seed_value: int):
+    """Fill the db with synthetic data."""
+    if transactions and not users:
+        raise click.BadParameter('Transactions need at least one user.', param_hint='--users')
+    counts = seed(users, beverages, transactions, cancel_ratio, deposit_ratio, days, batch_size, seed_value)
+    click.echo('Database seeded with {users} users, {beverages} beverages, {transactions} transactions '
+               'and {transaction_beverages} transaction beverages.'.format(**counts))
+
+
+@APP.cli.command('rebuild_consumption')
+@click.option('--from', 'from_timestamp', type=int, default=None,
+              help='Only days at or after the day of this unix timestamp.')
+@click.option('--to', 'to_timestamp', type=int, default=None,
+              help='Only days starting before this unix timestamp.')
+def rebuild_consumption(from_timestamp: int, to_timestamp: int):
+    """Recompute the daily consumption statistics from the transactions."""
+    rows = consumption.BeverageConsumption.rebuild(from_timestamp, to_timestamp)
+    DB.session.commit()
+    click.echo('Rebuilt {} daily consumption rows.'.format(rows))
+
+
+@APP.cli.command('sqlite_maintenance')
+def sqlite_maintenance():
+    """Checkpoint the SQLite WAL and run PRAGMA optimize."""
+    if not SQLITE_ENABLED:
+        raise click.UsageError('The database is not a SQLite database.')
+    result = run_maintenance()
+    click.echo('Checkpointed {checkpointed_pages} of {log_pages} WAL pages{}.'.format(
+        ', blocked by other connections' if result['busy'] else '', **result))
+
+
+@APP.cli.command('reconcile')
+@click.option('--fix', is_flag=True, help='Set drifted balances and stocks to their values according to the ledger.')
+@click.option('--rebase-stock', is_flag=True,
+              help='Accept the current stocks as correct, once for databases created before stock offsets existed.')
+@click.pass_context
+def reconcile(ctx, fix: bool, rebase_stock: bool):
+    """Compare balances and stocks with the transaction ledger."""
+    if rebase_stock:
+        click.echo('Rebased the stock of {} beverages.'.format(rebase_stocks()))
+        DB.session.commit()
+    drifted_users = 0
+    for row in balance_drift():
+        drifted_users += 1
+        click.echo('User {id} "{name}": balance {balance}, ledger {expected}, drift {drift}'.format(**row))
+    drifted_beverages = 0
+    for row in stock_drift():
+        drifted_beverages += 1
+        click.echo('Beverage {id} "{name}": stock {stock}, ledger {expected}, drift {drift}'.format(**row))
+    click.echo('{} users and {} beverages drifted.'.format(drifted_users, drifted_beverages))
+    if fix:
+        fixed_users, fixed_beverages = fix_drift()
+        DB.session.commit()
+        click.echo('Fixed {} users and {} beverages.'.format(fixed_users, fixed_beverages))
+    elif drifted_users or drifted_beverages:
+        ctx.exit(1)
+
+
 @APP.cli.command('drop_db')
 def drop_db():
     """Drop all db tables."""
@@ -42,3 +149,17 @@ def drop_db():
 def drop_db_function():
     DB.drop_all()
     APP.logger.info('Dropped Database.')
+
+
+@APP.cli.command('export_transactions')
+@click.option('--format', 'export_format', type=click.Choice(EXPORT_FORMATS), default='ndjson',
+              help='Output format.')
+@click.option('--from', 'from_timestamp', type=int, default=None,
+              help='Only transactions at or after this unix timestamp.')
+@click.option('--to', 'to_timestamp', type=int, default=None,
+              help='Only transactions before this unix timestamp.')
+@click.option('--output', type=click.File('w'), default='-', help='Output file, defaults to stdout.')
+def export_transactions_command(export_format: str, from_timestamp: int, to_timestamp: int, output):
+    """Export the transaction ledger."""
+    for line in export_transactions(export_format, from_timestamp, to_timestamp):
+        output.write(line)
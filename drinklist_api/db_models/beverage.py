@@ -2,6 +2,11 @@
 Module containing database models for everything concerning Beverages.
 """
 
+from typing import Dict
+
+from sqlalchemy import bindparam
+from sqlalchemy.sql import func
+
 from .. import DB
 from . import STD_STRING_SIZE
 
@@ -18,14 +23,37 @@ class Beverage(DB.Model):
     id = DB.Column(DB.Integer, primary_key=True)
     name = DB.Column(DB.String(STD_STRING_SIZE), unique=True)
     price = DB.Column(DB.Integer)
+    # Sum of all stock changes made by admins instead of transactions, so that
+    # stock == stock_offset + sum of all TransactionBeverage.count of this beverage.
+    # Declared before stock, as MySQL evaluates the SET clause of update() from left to right.
+    stock_offset = DB.Column(DB.Integer, nullable=False, default=0, server_default='0')
     stock = DB.Column(DB.Integer)
 
     def __init__(self, name: str, price: int, stock: int = 0):
         self.name = name
         self.price = price
         self.stock = stock
+        self.stock_offset = stock
 
     def update(self, name: str, price: int, stock: int = 0):
         self.name = name
         self.price = price
+        # computed by the database, so concurrent transactions are not counted as admin changes
+        self.stock_offset = Beverage.stock_offset + stock - func.coalesce(Beverage.stock, 0)
         self.stock = stock
+
+    @staticmethod
+    def change_stocks(deltas: Dict[int, int]):
+        """
+        Add the deltas (beverage id -> delta) to the stocks with atomic UPDATEs on the database server.
+
+        All UPDATEs are sent as one executemany, ordered by beverage id.
+        Loaded Beverage instances are not refreshed until the session is committed.
+        """
+        if not deltas:
+            return
+        table = Beverage.__table__
+        DB.session.execute(table.update()
+                           .where(table.c.id == bindparam('beverage_id'))
+                           .values(stock=table.c.stock + bindparam('delta')),
+                           [{'beverage_id': beverage_id, 'delta': delta} for beverage_id, delta in sorted(deltas.items())])
@@ -0,0 +1,103 @@
+"""
+Module containing database models for the daily consumption statistics of beverages.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam
+from sqlalchemy.sql import func, select
+
+from .. import APP, DB
+from . import insert_ignore_many
+from .beverage import Beverage
+from .transaction import Transaction
+from .transaction_beverage import TransactionBeverage
+
+__all__ = [ 'BeverageConsumption', ]
+
+DAY = 24 * 60 * 60
+
+
+def day_start(timestamp: int) -> int:
+    """
+    Get the unix timestamp of the start of the day containing timestamp.
+
+    Days start at midnight in the timezone STATISTICS_UTC_OFFSET seconds east of UTC.
+    """
+    return timestamp - (timestamp + APP.config['STATISTICS_UTC_OFFSET']) % DAY
+
+
+class BeverageConsumption(DB.Model):
+    """
+    Sum of the counts and amounts of all transactions of a beverage within one day
+
+    Maintained incrementally with every transaction; rebuild() recomputes it from the ledger.
+    """
+
+    __tablename__ = 'BeverageConsumption'
+
+    beverage_id = DB.Column(DB.Integer, DB.ForeignKey(Beverage.id), primary_key=True)
+    day = DB.Column(DB.Integer, primary_key=True, index=True)
+    count = DB.Column(DB.Integer, nullable=False, default=0)
+    amount = DB.Column(DB.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def collect(changes: Dict[Tuple[int, int], List[int]], beverage_id: int, timestamp: int, count: int, price: int):
+        """
+        Add a transaction beverage to changes ((beverage id, day) -> [count, amount]).
+        """
+        change = changes.setdefault((beverage_id, day_start(timestamp)), [0, 0])
+        change[0] += count
+        change[1] += count * price
+
+    @staticmethod
+    def change_consumption(changes: Dict[Tuple[int, int], List[int]]):
+        """
+        Add the collected changes to the rollup with atomic UPDATEs on the database server.
+
+        Missing rows are created first with insert-or-ignore, so concurrent transactions cannot
+        insert the same day twice.
+        """
+        if not changes:
+            return
+        table = BeverageConsumption.__table__
+        keys = sorted(changes)
+        insert_ignore_many(table, [{'beverage_id': beverage_id, 'day': day, 'count': 0, 'amount': 0}
+                                   for beverage_id, day in keys])
+        DB.session.execute(table.update()
+                           .where(and_(table.c.beverage_id == bindparam('key_beverage_id'),
+                                       table.c.day == bindparam('key_day')))
+                           .values(count=table.c.count + bindparam('count_delta'),
+                                   amount=table.c.amount + bindparam('amount_delta')),
+                           [{'key_beverage_id': beverage_id, 'key_day': day,
+                             'count_delta': changes[beverage_id, day][0], 'amount_delta': changes[beverage_id, day][1]}
+                            for beverage_id, day in keys])
+
+    @staticmethod
+    def rebuild(from_timestamp: Optional[int] = None, to_timestamp: Optional[int] = None) -> int:
+        """
+        Recompute the rollup of all days overlapping [from_timestamp, to_timestamp) from the ledger.
+
+        Runs as one DELETE and one INSERT ... SELECT in the current session, which is not committed.
+        Returns the number of rows of the rebuilt days.
+        """
+        table = BeverageConsumption.__table__
+        offset = APP.config['STATISTICS_UTC_OFFSET']
+        day = (Transaction.timestamp - (Transaction.timestamp + offset) % DAY).label('day')
+        delete = table.delete()
+        query = (select([TransactionBeverage.beverage_id, day,
+                         func.sum(TransactionBeverage.count),
+                         func.sum(TransactionBeverage.count * TransactionBeverage.price)])
+                 .select_from(TransactionBeverage.__table__.join(Transaction.__table__))
+                 .group_by(TransactionBeverage.beverage_id, day))
+        if from_timestamp is not None:
+            from_timestamp = day_start(from_timestamp)
+            delete = delete.where(table.c.day >= from_timestamp)
+            query = query.where(Transaction.timestamp >= from_timestamp)
+        if to_timestamp is not None:
+            to_timestamp = day_start(to_timestamp - 1) + DAY
+            delete = delete.where(table.c.day < to_timestamp)
+            query = query.where(Transaction.timestamp < to_timestamp)
+        DB.session.execute(delete)
+        return DB.session.execute(table.insert().from_select(['beverage_id', 'day', 'count', 'amount'],
+                                                              query)).rowcount
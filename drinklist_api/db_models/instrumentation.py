@@ -0,0 +1,92 @@
+"""
+Module for the instrumentation of all SQL statements.
+
+Statements slower than SQL_SLOW_QUERY_THRESHOLD seconds are logged with their parameters and
+the endpoint. The statements of every request are counted; if an endpoint exceeds its budget
+(SQL_STATEMENT_BUDGETS or SQL_STATEMENT_BUDGET) a warning is logged, or if
+SQL_STATEMENT_BUDGET_FAIL is set the statement exceeding the budget raises an error.
+"""
+
+from time import perf_counter
+from typing import Optional
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .. import APP, DB_LOGGER
+
+
+class StatementBudgetExceeded(Exception):
+    """
+    Raised if a request executes more SQL statements than its budget allows.
+    """
+    pass
+
+
+def current_endpoint() -> str:
+    """
+    Get the endpoint of the current request for log messages.
+    """
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'no request'
+
+
+def statement_budget(endpoint: str) -> Optional[int]:
+    """
+    Get the maximum number of SQL statements of a request to the given endpoint.
+    """
+    return APP.config['SQL_STATEMENT_BUDGETS'].get(endpoint, APP.config['SQL_STATEMENT_BUDGET'])
+
+
+@APP.before_request
+def start_statement_count():
+    """
+    Reset the statement count for a new request.
+    """
+    g.sql_statements = 0
+
+
+@APP.after_request
+def check_statement_budget(response):
+    """
+    Warn about requests which exceeded their statement budget.
+    """
+    budget = statement_budget(current_endpoint())
+    if budget is not None and g.get('sql_statements', 0) > budget:
+        DB_LOGGER.warning('Endpoint %s executed %d SQL statements, the budget is %d.',
+                          current_endpoint(), g.sql_statements, budget)
+    return response
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+# pylint: disable=W0613
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """
+    Count the statement and remember its start time.
+    """
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        budget = statement_budget(current_endpoint())
+        if APP.config['SQL_STATEMENT_BUDGET_FAIL'] and budget is not None and g.sql_statements > budget:
+            raise StatementBudgetExceeded('Endpoint {} exceeded its budget of {} SQL statements with: {}'
+                                          .format(current_endpoint(), budget, statement))
+    if context is not None:
+        context.query_start_time = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+# pylint: disable=W0613
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """
+    Log the statement if it was slow.
+    """
+    start = getattr(context, 'query_start_time', None)
+    threshold = APP.config['SQL_SLOW_QUERY_THRESHOLD']
+    if start is None or threshold is None:
+        return
+    duration = perf_counter() - start
+    if duration >= threshold:
+        DB_LOGGER.warning('Slow SQL statement (%.3fs) in endpoint %s: %s; parameters: %r',
+                          duration, current_endpoint(), statement, parameters)
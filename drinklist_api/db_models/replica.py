@@ -0,0 +1,95 @@
+"""
+Module for the read replica.
+
+If READ_REPLICA_BIND names one of the SQLALCHEMY_BINDS, the reads of GET handlers decorated with
+read_from_replica are executed on that bind (see db_routing). The lag of the replica is checked at
+most every READ_REPLICA_CHECK_INTERVAL seconds, by comparing the transaction ledgers of both
+databases. While the replica lags more than READ_REPLICA_MAX_LAG seconds behind the primary or is
+unreachable, all reads go to the primary.
+"""
+
+from functools import wraps
+from math import inf
+from threading import Lock
+from time import monotonic, time
+
+from flask import g, request
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import APP, DB, DB_LOGGER
+from .transaction import Transaction
+
+READ_REPLICA_ENABLED: bool = APP.config.get('READ_REPLICA_BIND') is not None
+
+if READ_REPLICA_ENABLED and APP.config['READ_REPLICA_BIND'] not in (APP.config.get('SQLALCHEMY_BINDS') or {}):
+    raise ValueError('READ_REPLICA_BIND {} is not one of the SQLALCHEMY_BINDS.'.format(APP.config['READ_REPLICA_BIND']))
+
+
+def replica_lag() -> float:
+    """
+    Get the seconds since the oldest transaction missing on the replica was created on the primary.
+
+    Returns 0 if the replica has all transactions.
+    """
+    table = Transaction.__table__
+    with DB.get_engine(APP, APP.config['READ_REPLICA_BIND']).connect() as connection:
+        newest = connection.execute(select([func.max(table.c.id)])).scalar()
+    with DB.engine.connect() as connection:
+        oldest_missing = connection.execute(select([func.min(table.c.timestamp)])
+                                            .where(table.c.id > (newest or 0))).scalar()
+    if oldest_missing is None:
+        return 0.0
+    return max(0.0, time() - oldest_missing)
+
+
+class ReplicaState():
+    """
+    Cached result of the lag check of this process.
+    """
+
+    def __init__(self, max_lag: float, check_interval: float):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = 0.0
+        self._lock = Lock()
+        self._checked = -inf
+
+    def usable(self) -> bool:
+        """
+        Check if the replica is fresh enough, checking its lag again if the last check is too old.
+
+        Only one thread checks the lag, the others use the previous result meanwhile.
+        """
+        if monotonic() - self._checked >= self.check_interval and self._lock.acquire(blocking=False):
+            try:
+                was_usable = self.lag <= self.max_lag
+                try:
+                    self.lag = replica_lag()
+                except SQLAlchemyError:
+                    DB_LOGGER.exception('Could not check the lag of the read replica.')
+                    self.lag = inf
+                self._checked = monotonic()
+                if was_usable != (self.lag <= self.max_lag):
+                    DB_LOGGER.warning('Read replica lags %.1fs behind the primary, reading from the %s.',
+                                      self.lag, 'replica' if self.lag <= self.max_lag else 'primary')
+            finally:
+                self._lock.release()
+        return self.lag <= self.max_lag
+
+
+REPLICA_STATE = ReplicaState(APP.config['READ_REPLICA_MAX_LAG'], APP.config['READ_REPLICA_CHECK_INTERVAL'])
+
+
+def read_from_replica(func):
+    """
+    Decorator for safe GET handlers whose reads may be served by the read replica.
+
+    Writes of the handler and all reads after them still go to the primary.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if READ_REPLICA_ENABLED and request.method in ('GET', 'HEAD') and REPLICA_STATE.usable():
+            g.read_replica = True
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,94 @@
+"""
+Module for the SQLite tuning profile and maintenance.
+
+SQLITE_PRAGMAS are set on every new SQLite connection. The defaults switch to WAL, so readers
+and the writer do not block each other, and let connections wait for locks instead of failing
+with "database is locked". Every process checkpoints the WAL and runs PRAGMA optimize at most
+every SQLITE_MAINTENANCE_INTERVAL seconds, after a response was sent.
+"""
+
+import sqlite3
+from threading import Lock
+from time import monotonic
+from typing import Dict
+
+from flask import Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from .. import APP, DB, DB_LOGGER
+
+SQLITE_ENABLED: bool = APP.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('sqlite://')
+
+
+def run_maintenance() -> Dict[str, int]:
+    """
+    Checkpoint the WAL and update the statistics of the query planner.
+
+    Returns the result of the checkpoint: whether it was blocked by other connections,
+    the number of pages in the WAL and the number of checkpointed pages.
+    """
+    with DB.engine.connect() as connection:
+        busy, log, checkpointed = connection.execute('PRAGMA wal_checkpoint({})'.format(
+            APP.config['SQLITE_CHECKPOINT_MODE'])).first()
+        connection.execute('PRAGMA optimize')
+    return {'busy': busy, 'log_pages': log, 'checkpointed_pages': checkpointed}
+
+
+class MaintenanceSchedule():
+    """
+    Schedule of the maintenance of this process.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = Lock()
+        self._last = monotonic()
+
+    def claim(self) -> bool:
+        """
+        Check if the maintenance is due and reset the interval if it is.
+        """
+        with self._lock:
+            if monotonic() - self._last < self.interval:
+                return False
+            self._last = monotonic()
+            return True
+
+    @staticmethod
+    def run():
+        """
+        Run the maintenance, logging instead of raising errors.
+        """
+        try:
+            result = run_maintenance()
+            DB_LOGGER.debug('SQLite maintenance: %s', result)
+        except SQLAlchemyError:
+            DB_LOGGER.exception('SQLite maintenance failed.')
+
+
+if SQLITE_ENABLED:
+    @event.listens_for(Engine, 'connect')
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        if APP.config.get('SQLITE_FOREIGN_KEYS', True):
+            cursor.execute("PRAGMA foreign_keys=ON")
+        for name, value in APP.config.get('SQLITE_PRAGMAS', {}).items():
+            if value is not None:
+                cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+    if APP.config.get('SQLITE_MAINTENANCE_INTERVAL') is not None:
+        MAINTENANCE = MaintenanceSchedule(APP.config['SQLITE_MAINTENANCE_INTERVAL'])
+
+        @APP.after_request
+        def schedule_maintenance(response: Response) -> Response:
+            """
+            Run the maintenance after the response was sent if it is due.
+            """
+            if MAINTENANCE.claim():
+                response.call_on_close(MAINTENANCE.run)
+            return response
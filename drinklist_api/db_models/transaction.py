@@ -22,11 +22,12 @@ class Transaction(DB.Model):
     __tablename__ = 'Transaction'
 
     id = DB.Column(DB.Integer, primary_key=True)
-    user_id = DB.Column(DB.Integer, DB.ForeignKey(User.id), nullable=True)
+    user_id = DB.Column(DB.Integer, DB.ForeignKey(User.id), nullable=True, index=True)
     amount = DB.Column(DB.Integer, nullable=True)
     reason = DB.Column(DB.Text, nullable=True)
-    cancels_id = DB.Column(DB.Integer, DB.ForeignKey(id), nullable=True)
-    timestamp = DB.Column(DB.Integer)
+    # set on a canceled transaction and references its cancellation, which cancels only one transaction
+    cancels_id = DB.Column(DB.Integer, DB.ForeignKey(id), nullable=True, index=True, unique=True)
+    timestamp = DB.Column(DB.Integer, index=True)
 
     user = DB.relationship(User, lazy='joined')
     cancels = DB.relationship('Transaction', single_parent=True, uselist=False, lazy='joined')
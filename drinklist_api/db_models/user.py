@@ -2,6 +2,10 @@
 Module containing database models for everything concerning Users.
 """
 
+from typing import Dict
+
+from sqlalchemy import bindparam
+
 from .. import DB
 from . import STD_STRING_SIZE
 
@@ -27,3 +31,19 @@ class User(DB.Model):
 
     def update(self, active:bool):
         self.active = active
+
+    @staticmethod
+    def change_balances(deltas: Dict[int, int]):
+        """
+        Add the deltas (user id -> delta) to the balances with atomic UPDATEs on the database server.
+
+        All UPDATEs are sent as one executemany, ordered by user id.
+        Loaded User instances are not refreshed until the session is committed.
+        """
+        if not deltas:
+            return
+        table = User.__table__
+        DB.session.execute(table.update()
+                           .where(table.c.id == bindparam('user_id'))
+                           .values(balance=table.c.balance + bindparam('delta')),
+                           [{'user_id': user_id, 'delta': delta} for user_id, delta in sorted(deltas.items())])
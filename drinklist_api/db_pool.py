@@ -0,0 +1,68 @@
+"""
+Module for the database connection pool and its telemetry.
+
+Flask-SQLAlchemy 2.3 only passes SQLALCHEMY_POOL_SIZE, SQLALCHEMY_POOL_TIMEOUT, SQLALCHEMY_POOL_RECYCLE
+and SQLALCHEMY_MAX_OVERFLOW to the engine. PoolConfigSQLAlchemy also passes SQLALCHEMY_POOL_PRE_PING and
+SQLALCHEMY_ENGINE_OPTIONS, and pools connections of server databases in an InstrumentedQueuePool,
+which records the time spent waiting for a connection and the number of connections in use and
+logs checkouts slower than SQLALCHEMY_POOL_SLOW_CHECKOUT seconds.
+"""
+
+from time import perf_counter
+
+from flask import has_request_context, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.pool import QueuePool
+
+from . import APP, DB_LOGGER
+from .metrics import observe_pool_in_use, observe_pool_wait, observe_pool_waiting
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool recording the duration of every checkout and the number of checked out connections.
+
+    The checkout duration includes opening a new connection if the pool had no idle connection.
+    The metrics are labeled with the logging name of the pool.
+    """
+
+    def _do_get(self):
+        name = self.logging_name or 'default'
+        start = perf_counter()
+        observe_pool_waiting(name, 1)
+        try:
+            connection = super()._do_get()
+        finally:
+            wait = perf_counter() - start
+            observe_pool_waiting(name, -1)
+            observe_pool_wait(name, wait)
+        observe_pool_in_use(name, 1)
+        threshold = APP.config.get('SQLALCHEMY_POOL_SLOW_CHECKOUT')
+        if threshold is not None and wait >= threshold:
+            DB_LOGGER.warning('Waited %.3fs for a connection of pool %s in endpoint %s, '
+                              '%d connections checked out, pool size %d, overflow %d.',
+                              wait, name, request.endpoint if has_request_context() else 'no request',
+                              self.checkedout(), self.size(), self.overflow())
+        return connection
+
+    def _do_return_conn(self, conn):
+        observe_pool_in_use(self.logging_name or 'default', -1)
+        super()._do_return_conn(conn)
+
+
+class PoolConfigSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy extension passing the whole pool configuration to the engines.
+    """
+
+    def apply_pool_defaults(self, app, options):
+        super().apply_pool_defaults(app, options)
+        if app.config.get('SQLALCHEMY_POOL_PRE_PING') is not None:
+            options['pool_pre_ping'] = app.config['SQLALCHEMY_POOL_PRE_PING']
+
+    def apply_driver_hacks(self, app, info, options):
+        super().apply_driver_hacks(app, info, options)
+        # SQLite files get a NullPool and in-memory SQLite a StaticPool from Flask-SQLAlchemy
+        options.setdefault('poolclass', InstrumentedQueuePool)
+        options.setdefault('pool_logging_name', info.database)
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
@@ -0,0 +1,41 @@
+"""
+Module for routing the reads of safe requests to a read replica.
+
+Requests whose handler is decorated with db_models.replica.read_from_replica set g.read_replica,
+and the RoutingSession executes their SELECT statements on the READ_REPLICA_BIND. The first write
+of the request, i.e. a flush or any other statement, ends the routing, so all further reads of the
+request go to the primary and see the written data.
+"""
+
+from flask import g, has_request_context
+from flask_sqlalchemy import SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql.expression import CompoundSelect, Select
+
+from . import APP
+from .db_pool import PoolConfigSQLAlchemy
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session executing the reads of requests marked with g.read_replica on the read replica.
+
+    Models with their own __bind_key__ keep their bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context() and g.get('read_replica', False):
+            if self._flushing or not isinstance(clause, (Select, CompoundSelect)):
+                g.read_replica = False
+            elif mapper is None or getattr(mapper.mapped_table, 'info', {}).get('bind_key') is None:
+                return get_state(self.app).db.get_engine(self.app, bind=APP.config['READ_REPLICA_BIND'])
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(PoolConfigSQLAlchemy):
+    """
+    Flask-SQLAlchemy extension using the RoutingSession.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
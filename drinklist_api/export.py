@@ -0,0 +1,110 @@
+"""
+Module for streaming exports of the transaction ledger.
+"""
+
+import csv
+import json
+from io import StringIO
+from itertools import chain, groupby
+from operator import attrgetter
+from typing import Iterable, Iterator
+
+from . import APP, DB
+from .db_models.beverage import Beverage
+from .db_models.transaction import Transaction
+from .db_models.transaction_beverage import TransactionBeverage
+from .db_models.user import User
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = ('transaction_id', 'timestamp', 'user', 'amount', 'reason', 'cancels_id',
+               'beverage_id', 'beverage', 'count', 'price')
+
+
+def ledger_rows(from_timestamp: int = None, to_timestamp: int = None) -> Iterable:
+    """
+    Query one row per transaction line item, ordered by transaction.
+
+    Transactions without beverages produce a single row with empty beverage columns.
+    The rows are fetched from the database in batches of EXPORT_BATCH_SIZE.
+    """
+    query = DB.session.query(Transaction.id.label('transaction_id'),
+                             Transaction.timestamp,
+                             User.name.label('user'),
+                             Transaction.amount,
+                             Transaction.reason,
+                             Transaction.cancels_id,
+                             TransactionBeverage.beverage_id,
+                             Beverage.name.label('beverage'),
+                             TransactionBeverage.count,
+                             TransactionBeverage.price) \
+        .select_from(Transaction) \
+        .outerjoin(User, Transaction.user_id == User.id) \
+        .outerjoin(TransactionBeverage, TransactionBeverage.transaction_id == Transaction.id) \
+        .outerjoin(Beverage, TransactionBeverage.beverage_id == Beverage.id)
+
+    if from_timestamp is not None:
+        query = query.filter(Transaction.timestamp >= from_timestamp)
+    if to_timestamp is not None:
+        query = query.filter(Transaction.timestamp < to_timestamp)
+
+    return query.order_by(Transaction.id, TransactionBeverage.beverage_id) \
+        .yield_per(APP.config['EXPORT_BATCH_SIZE'])
+
+
+def generate_ndjson(rows: Iterable) -> Iterator[str]:
+    """
+    Generate one json line per transaction from the rows of ledger_rows.
+    """
+    for transaction_id, items in groupby(rows, key=attrgetter('transaction_id')):
+        first = next(items)
+        beverages = [first] + list(items) if first.beverage_id is not None else []
+        transaction = {
+            'id': transaction_id,
+            'timestamp': first.timestamp,
+            'user': first.user,
+            'amount': first.amount,
+            'reason': first.reason,
+            'cancels_id': first.cancels_id,
+            'beverages': [{
+                'beverage_id': item.beverage_id,
+                'beverage': item.beverage,
+                'count': item.count,
+                'price': item.price,
+            } for item in beverages],
+        }
+        yield json.dumps(transaction) + '\n'
+
+
+def generate_csv(rows: Iterable) -> Iterator[str]:
+    """
+    Generate the csv lines (including the header) from the rows of ledger_rows.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    for row in chain((CSV_COLUMNS,), rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_transactions(export_format: str, from_timestamp: int = None, to_timestamp: int = None) -> Iterator[str]:
+    """
+    Generate the transaction ledger in the given export format.
+
+    Raises:
+        ValueError -- If the export format is not one of EXPORT_FORMATS
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError('Unknown export format "{}".'.format(export_format))
+    rows = ledger_rows(from_timestamp, to_timestamp)
+    if export_format == 'csv':
+        return generate_csv(rows)
+    return generate_ndjson(rows)
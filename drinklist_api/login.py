@@ -3,10 +3,16 @@ Module for the authentication and user handling
 """
 
 from enum import IntEnum
-from typing import Dict, List, Union
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List, Optional, Type, Union
 from abc import ABC, abstractmethod
+from sqlalchemy.exc import SQLAlchemyError
+from .db_models import insert_ignore
 from .db_models.user import User
-from . import DB
+from .metrics import observe_login
+from .auth_providers import load_provider
+from . import DB, DB_LOGGER
 
 class UserRole(IntEnum):
     """
@@ -37,22 +43,23 @@ class LoginProvider(ABC):
     Abstract class which allows the login service to lookup users.
     """
 
-    __registered_providers__: Dict[str, 'LoginProvider'] = {}
+    __registered_providers__: Dict[str, Type['LoginProvider']] = {}
+    __provider_instances__: Dict[str, 'LoginProvider'] = {}
 
     def __init_subclass__(cls, provider_name: str = None):
         if provider_name is None:
-            LoginProvider.register_provider(cls.__name__, cls())
+            LoginProvider.register_provider(cls.__name__, cls)
         else:
-            LoginProvider.register_provider(provider_name, cls())
+            LoginProvider.register_provider(provider_name, cls)
 
     @staticmethod
-    def register_provider(name: str, login_provider: 'LoginProvider'):
+    def register_provider(name: str, login_provider: Type['LoginProvider']):
         """
-        Register an Instance of LoginProvider under given name.
+        Register a LoginProvider class under given name. It is instantiated on first use.
 
         Arguments:
             name {str} -- Name of the LoginProvider
-            login_provider {LoginProvider} -- LoginProvider Instance
+            login_provider {Type[LoginProvider]} -- LoginProvider class
 
         Raises:
             KeyError -- If name is already registered with a different LoginProvider
@@ -64,7 +71,7 @@ class LoginProvider(ABC):
     @staticmethod
     def get_login_provider(name: str) -> Union['LoginProvider', None]:
         """
-        Get a registered LoginProvider by its name.
+        Get the LoginProvider with the given name, importing and instantiating it on first use.
 
         Arguments:
             name {str} -- Name of the LoginProvider
@@ -72,13 +79,21 @@ class LoginProvider(ABC):
         Returns:
             Union[LoginProvider, None] -- LoginProvider or None
         """
-        return LoginProvider.__registered_providers__.get(name)
+        if name not in LoginProvider.__registered_providers__ and not load_provider(name):
+            return None
+        provider = LoginProvider.__provider_instances__.get(name)
+        if provider is None:
+            provider = LoginProvider.__registered_providers__[name]()
+            LoginProvider.__provider_instances__[name] = provider
+        return provider
 
     @staticmethod
     def list_login_providers() -> List[str]:
         """
         Get a list of Registered names of LoginProviders.
 
+        Only providers which were used before are registered.
+
         Returns:
             List[str] -- All registered names of LoginProviders.
         """
@@ -128,6 +143,80 @@ class LoginProvider(ABC):
         """
         pass
 
+    def current_role(self, user_id: str) -> Optional[UserRole]:
+        """
+        Get the current role of a user for a token refresh or None if the user may not login anymore
+        """
+        if not self.valid_user(user_id):
+            return None
+        if self.is_admin(user_id):
+            return UserRole.ADMIN
+        if self.is_kiosk_user(user_id):
+            return UserRole.KIOSK_USER
+        return UserRole.USER
+
+    def role_cache_stats(self) -> Optional[Dict[str, float]]:
+        """
+        Statistics of the role cache of this provider or None if it does not cache roles
+        """
+        return None
+
+    def flush_user(self, user_id: str) -> bool:
+        """
+        Remove a user from the role cache of this provider. Returns whether the user was cached.
+        """
+        return False
+
+    def close_connections(self) -> None:
+        """
+        Close all pooled connections of this provider, e.g. before or after a fork.
+        """
+        pass
+
+
+class KnownUsers():
+    """
+    In-process cache of the names and ids of all users in the database.
+
+    It is loaded with the first login of a consuming user.
+    """
+
+    _ids: Dict[str, int]
+
+    def __init__(self):
+        self._ids = {}
+        self._warm = False
+        self._lock = Lock()
+
+    def warm(self) -> None:
+        """
+        Load the names and ids of all users from the database.
+        """
+        with self._lock:
+            if not self._warm:
+                self._ids.update(DB.session.query(User.name, User.id))
+                self._warm = True
+
+    def ensure_user(self, name: str) -> int:
+        """
+        Get the id of the user with the given name, creating the user if it does not exist yet.
+        """
+        if not self._warm:
+            try:
+                self.warm()
+            except SQLAlchemyError:
+                # the cache only saves lookups, so fall back to looking up this user
+                DB_LOGGER.warning('Could not load the known users, looking up user "%s" alone.', name, exc_info=True)
+                DB.session.rollback()
+        user_id = self._ids.get(name)
+        if user_id is None:
+            # concurrent first logins (also in other processes) may insert the same user
+            insert_ignore(User.__table__, name=name, active=True, balance=0)
+            user_id = DB.session.query(User.id).filter(User.name == name).scalar()
+            DB.session.commit()
+            self._ids[name] = user_id
+        return user_id
+
 
 class LoginService():
     """
@@ -135,9 +224,11 @@ class LoginService():
     """
 
     _login_providers: List[LoginProvider]
+    _known_users: KnownUsers
 
     def __init__(self, login_providers: List[str]):
         self._login_providers = []
+        self._known_users = KnownUsers()
 
         if login_providers:
             for name in login_providers:
@@ -151,7 +242,10 @@ class LoginService():
         Getter for a user object
         """
         for provider in self._login_providers:
-            if provider.valid_user(user) and provider.valid_password(user, password):
+            start = perf_counter()
+            valid = provider.valid_user(user) and provider.valid_password(user, password)
+            observe_login(type(provider).__name__, valid, perf_counter() - start)
+            if valid:
                 user_obj = AuthUser(user, provider)
                 if provider.is_admin(user):
                     user_obj.role = UserRole.ADMIN
@@ -159,14 +253,47 @@ class LoginService():
                     user_obj.role = UserRole.KIOSK_USER
                 
                 if provider.is_consuming_user(user):
-                    db_user = User.query.filter(User.name == user).first()
-                    if db_user is None:
-                        db_user = User(user)
-                        DB.session.add(db_user)
-                        DB.session.commit()
+                    self._known_users.ensure_user(user)
                 return user_obj
         return None
 
+    def current_role(self, user: str) -> Optional[UserRole]:
+        """
+        Get the current role of a user from the first login provider knowing the user, None if no provider does
+        """
+        for provider in self._login_providers:
+            role = provider.current_role(user)
+            if role is not None:
+                return role
+        return None
+
+    def role_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Statistics of the role caches of all login providers, which cache roles
+        """
+        stats = {}
+        for provider in self._login_providers:
+            provider_stats = provider.role_cache_stats()
+            if provider_stats is not None:
+                stats[type(provider).__name__] = provider_stats
+        return stats
+
+    def flush_user(self, user: str) -> bool:
+        """
+        Remove a user from the role caches of all login providers. Returns whether the user was cached.
+        """
+        flushed = False
+        for provider in self._login_providers:
+            flushed = provider.flush_user(user) or flushed
+        return flushed
+
+    def close_connections(self) -> None:
+        """
+        Close all pooled connections of all login providers
+        """
+        for provider in self._login_providers:
+            provider.close_connections()
+
     def check_password(self, user: AuthUser, password: str) -> bool:
         """
         Check function for a password with an existing user object
@@ -0,0 +1,123 @@
+"""
+Module for Prometheus metrics of the API.
+
+Metrics are only collected if METRICS_ENABLED is set. They are exposed in the Prometheus text
+format at METRICS_PATH. If the app runs in multiple worker processes, METRICS_MULTIPROC_DIR must
+point to an empty directory shared by all workers, which is used to aggregate the metrics.
+"""
+
+import os
+from time import perf_counter
+
+from flask import g, request, Response
+
+from . import APP
+
+METRICS_ENABLED: bool = APP.config.get('METRICS_ENABLED', False)
+
+if METRICS_ENABLED:
+    if APP.config.get('METRICS_MULTIPROC_DIR'):
+        # must be set before prometheus_client is imported
+        os.environ.setdefault('prometheus_multiproc_dir', APP.config['METRICS_MULTIPROC_DIR'])
+
+    # pylint: disable=C0413
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+    from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+
+    REQUEST_COUNT = Counter('drinklist_http_requests_total', 'Number of handled requests.',
+                            ['endpoint', 'method', 'status'])
+    REQUEST_LATENCY = Histogram('drinklist_http_request_duration_seconds',
+                                'Time until the response of a request was created.',
+                                ['endpoint', 'method', 'status'])
+    RESPONSE_SIZE = Histogram('drinklist_http_response_size_bytes', 'Size of the response bodies.',
+                              ['endpoint', 'method', 'status'],
+                              buckets=(100, 1000, 10000, 100000, 1000000, 10000000, float('inf')))
+    SQL_STATEMENTS = Histogram('drinklist_sql_statements_per_request', 'Number of SQL statements per request.',
+                               ['endpoint', 'method', 'status'],
+                               buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, float('inf')))
+    LOGIN_LATENCY = Histogram('drinklist_login_provider_duration_seconds',
+                              'Time a login provider needed to check a login.',
+                              ['provider', 'success'])
+    POOL_WAIT = Histogram('drinklist_db_pool_checkout_wait_seconds',
+                          'Time spent waiting for a database connection from the pool.', ['pool'],
+                          buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, float('inf')))
+    POOL_WAITING = Gauge('drinklist_db_pool_waiting_checkouts', 'Number of checkouts waiting for a connection.',
+                         ['pool'], multiprocess_mode='livesum')
+    POOL_IN_USE = Gauge('drinklist_db_pool_connections_in_use', 'Number of checked out database connections.',
+                        ['pool'], multiprocess_mode='livesum')
+
+    @APP.before_request
+    def start_request_metrics():
+        """
+        Start the measurements of a request.
+        """
+        g.metrics_start = perf_counter()
+
+    @APP.after_request
+    def record_request_metrics(response):
+        """
+        Record the metrics of a request.
+
+        For streamed responses only the time until the first byte and no size is recorded.
+        """
+        if 'metrics_start' not in g:
+            return response
+        labels = (request.endpoint or 'unknown', request.method, str(response.status_code))
+        REQUEST_COUNT.labels(*labels).inc()
+        REQUEST_LATENCY.labels(*labels).observe(perf_counter() - g.metrics_start)
+        SQL_STATEMENTS.labels(*labels).observe(g.get('sql_statements', 0))
+        if not response.is_streamed:
+            RESPONSE_SIZE.labels(*labels).observe(response.calculate_content_length() or 0)
+        return response
+
+    def metrics():
+        """
+        Render all metrics in the Prometheus text format.
+        """
+        registry = REGISTRY
+        if 'prometheus_multiproc_dir' in os.environ:
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    APP.add_url_rule(APP.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics)
+
+
+def observe_login(provider: str, success: bool, duration: float) -> None:
+    """
+    Record the time a login provider needed to check a login.
+    """
+    if METRICS_ENABLED:
+        LOGIN_LATENCY.labels(provider, str(success).lower()).observe(duration)
+
+
+def observe_pool_wait(pool: str, duration: float) -> None:
+    """
+    Record the time a checkout waited for a connection of a database pool.
+    """
+    if METRICS_ENABLED:
+        POOL_WAIT.labels(pool).observe(duration)
+
+
+def observe_pool_waiting(pool: str, delta: int) -> None:
+    """
+    Change the number of checkouts waiting for a connection of a database pool.
+    """
+    if METRICS_ENABLED:
+        POOL_WAITING.labels(pool).inc(delta)
+
+
+def observe_pool_in_use(pool: str, delta: int) -> None:
+    """
+    Change the number of checked out connections of a database pool.
+    """
+    if METRICS_ENABLED:
+        POOL_IN_USE.labels(pool).inc(delta)
+
+
+def observe_worker_exit(pid: int) -> None:
+    """
+    Remove the live gauges of an exited worker process from the aggregated metrics.
+    """
+    if METRICS_ENABLED and 'prometheus_multiproc_dir' in os.environ:
+        mark_process_dead(pid)
@@ -0,0 +1,121 @@
+"""
+Module for verifying the denormalized balances and stocks against the transaction ledger.
+
+The expected values are computed by the database with grouped aggregates, only drifting
+rows are transferred and fixes are single UPDATE statements, so memory use does not
+depend on the size of the ledger.
+"""
+
+from typing import Dict, Iterator, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.sql import func, select
+
+from . import DB, APP
+from .db_models.beverage import Beverage
+from .db_models.transaction import Transaction
+from .db_models.transaction_beverage import TransactionBeverage
+from .db_models.user import User
+
+
+def ledger_balances():
+    """
+    Subquery of the sum of all transaction amounts per user.
+    """
+    return (select([Transaction.user_id, func.sum(Transaction.amount).label('total')])
+            .group_by(Transaction.user_id).alias('ledger'))
+
+
+def ledger_stocks():
+    """
+    Subquery of the sum of all transaction beverage counts per beverage.
+    """
+    return (select([TransactionBeverage.beverage_id, func.sum(TransactionBeverage.count).label('total')])
+            .group_by(TransactionBeverage.beverage_id).alias('ledger'))
+
+
+def expected_balance():
+    """
+    Correlated scalar subquery of the balance of a user according to the ledger.
+    """
+    return (select([func.coalesce(func.sum(Transaction.amount), 0)])
+            .where(Transaction.user_id == User.id).as_scalar())
+
+
+def expected_stock():
+    """
+    Correlated scalar subquery of the stock of a beverage according to the ledger.
+    """
+    return (Beverage.stock_offset + select([func.coalesce(func.sum(TransactionBeverage.count), 0)])
+            .where(TransactionBeverage.beverage_id == Beverage.id).as_scalar())
+
+
+def stream(query) -> Iterator[Dict[str, int]]:
+    """
+    Execute the query with a server side cursor where supported and yield the rows as dicts.
+    """
+    for row in DB.session.execute(query.execution_options(stream_results=True)):
+        yield dict(row)
+
+
+def balance_drift() -> Iterator[Dict[str, int]]:
+    """
+    Yield all users whose balance differs from the sum of their transactions.
+    """
+    ledger = ledger_balances()
+    expected = func.coalesce(ledger.c.total, 0)
+    balance = func.coalesce(User.balance, 0)
+    yield from stream(select([User.id, User.name, User.balance, expected.label('expected'),
+                              (balance - expected).label('drift')])
+                      .select_from(User.__table__.outerjoin(ledger, ledger.c.user_id == User.id))
+                      .where(or_(User.balance.is_(None), User.balance != expected))
+                      .order_by(User.id))
+
+
+def stock_drift() -> Iterator[Dict[str, int]]:
+    """
+    Yield all beverages whose stock differs from the admin changes plus the sum of their transactions.
+    """
+    ledger = ledger_stocks()
+    expected = Beverage.stock_offset + func.coalesce(ledger.c.total, 0)
+    stock = func.coalesce(Beverage.stock, 0)
+    yield from stream(select([Beverage.id, Beverage.name, Beverage.stock, expected.label('expected'),
+                              (stock - expected).label('drift')])
+                      .select_from(Beverage.__table__.outerjoin(ledger, ledger.c.beverage_id == Beverage.id))
+                      .where(or_(Beverage.stock.is_(None), Beverage.stock != expected))
+                      .order_by(Beverage.id))
+
+
+def fix_drift() -> Tuple[int, int]:
+    """
+    Set all balances and stocks to their values according to the ledger.
+
+    Runs two UPDATE statements in the current session, which is not committed.
+    Returns the number of fixed users and beverages.
+    """
+    users = User.__table__
+    balance = expected_balance()
+    fixed_users = DB.session.execute(users.update()
+                                     .where(or_(users.c.balance.is_(None), users.c.balance != balance))
+                                     .values(balance=balance)).rowcount
+    beverages = Beverage.__table__
+    stock = expected_stock()
+    fixed_beverages = DB.session.execute(beverages.update()
+                                         .where(or_(beverages.c.stock.is_(None), beverages.c.stock != stock))
+                                         .values(stock=stock)).rowcount
+    APP.logger.info('Fixed the balance of %d users and the stock of %d beverages.', fixed_users, fixed_beverages)
+    return fixed_users, fixed_beverages
+
+
+def rebase_stocks() -> int:
+    """
+    Accept the current stocks as correct by recomputing the stock offsets of all beverages.
+
+    Needed once for databases which were created before stock_offset existed.
+    Runs one UPDATE statement in the current session, which is not committed.
+    """
+    beverages = Beverage.__table__
+    counts = (select([func.coalesce(func.sum(TransactionBeverage.count), 0)])
+              .where(TransactionBeverage.beverage_id == Beverage.id).as_scalar())
+    return DB.session.execute(beverages.update()
+                              .values(stock_offset=func.coalesce(beverages.c.stock, 0) - counts)).rowcount
@@ -0,0 +1,168 @@
+"""
+Module for generating synthetic users, beverages and transactions for scale tests.
+
+All rows are inserted with executemany batches and explicit primary keys, so the
+transaction beverages can reference their transactions without reading ids back.
+Balances, stocks and the consumption statistics are updated with the generated transactions.
+"""
+
+import time
+from collections import deque
+from random import Random
+from typing import Deque, Dict, List, Tuple
+
+from sqlalchemy import bindparam
+from sqlalchemy.sql import func
+
+from . import DB, APP
+from .db_models.beverage import Beverage
+from .db_models.consumption import BeverageConsumption
+from .db_models.transaction import Transaction
+from .db_models.transaction_beverage import TransactionBeverage
+from .db_models.user import User
+
+# number of recent transactions which may still be canceled
+CANCEL_WINDOW = 1000
+
+
+def next_id(model) -> int:
+    """
+    Get the next free primary key of a model.
+    """
+    return (DB.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def reset_sequences(*models):
+    """
+    Move the id sequences of PostgreSQL past the explicitly inserted primary keys.
+    """
+    if DB.session.get_bind().dialect.name != 'postgresql':
+        return
+    for model in models:
+        DB.session.execute("SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+                           "(SELECT max(id) FROM \"{0}\"))".format(model.__tablename__))
+
+
+def insert_batch(model, rows: List[dict]):
+    """
+    Insert the rows with one executemany and clear the list.
+    """
+    if rows:
+        DB.session.execute(model.__table__.insert(), rows)
+        rows.clear()
+
+
+def link_cancellations(cancellations: List[dict]):
+    """
+    Set cancels_id of the canceled transactions to their cancellations with one executemany and clear the list.
+    """
+    if cancellations:
+        table = Transaction.__table__
+        DB.session.execute(table.update().where(table.c.id == bindparam('canceled_id'))
+                           .values(cancels_id=bindparam('cancellation_id')), cancellations)
+        cancellations.clear()
+
+
+# pylint: disable=R0913,R0914
+def seed(users: int, beverages: int, transactions: int, cancel_ratio: float = 0.05, deposit_ratio: float = 0.1,
+         days: int = 365, batch_size: int = 10000, seed_value: int = 0) -> Dict[str, int]:
+    """
+    Insert users, beverages and transactions into the database and commit them.
+
+    Transactions are purchases of one to three beverages (negative counts), deposits without
+    beverages and cancellations of recent transactions, spread evenly over the last days.
+    Returns the number of inserted rows per table.
+    """
+    rng = Random(seed_value)
+    balance_changes: Dict[int, int] = {}
+    stock_changes: Dict[int, int] = {}
+
+    first_user = next_id(User)
+    user_ids = list(range(first_user, first_user + users))
+    user_rows = [{'id': user_id, 'name': 'seed-user-{}'.format(user_id), 'active': rng.random() > 0.05, 'balance': 0}
+                 for user_id in user_ids]
+    for start in range(0, len(user_rows), batch_size):
+        insert_batch(User, user_rows[start:start + batch_size])
+
+    first_beverage = next_id(Beverage)
+    prices: Dict[int, int] = {}
+    beverage_rows = []
+    for beverage_id in range(first_beverage, first_beverage + beverages):
+        prices[beverage_id] = rng.randrange(50, 300, 10)
+        beverage_rows.append({'id': beverage_id, 'name': 'seed-beverage-{}'.format(beverage_id),
+                              'price': prices[beverage_id], 'stock': 0, 'stock_offset': 0})
+        stock_changes[beverage_id] = 0
+    insert_batch(Beverage, beverage_rows)
+    beverage_ids = list(prices)
+
+    transaction_rows: List[dict] = []
+    beverage_line_rows: List[dict] = []
+    cancellations: List[dict] = []
+    # (transaction id, user id, amount, timestamp, [(beverage id, count, price)])
+    cancelable: Deque[Tuple[int, int, int, int, List[Tuple[int, int, int]]]] = deque(maxlen=CANCEL_WINDOW)
+    first_transaction = next_id(Transaction)
+    end = int(time.time())
+    start_time = end - days * 24 * 60 * 60
+    lines = 0
+    for offset in range(transactions):
+        transaction_id = first_transaction + offset
+        timestamp = start_time + (end - start_time) * offset // max(1, transactions)
+        kind = rng.random()
+        if kind < cancel_ratio and cancelable:
+            canceled_id, user_id, amount, canceled_timestamp, canceled_lines = \
+                cancelable.popleft() if rng.random() < 0.5 else cancelable.pop()
+            transaction_rows.append({'id': transaction_id, 'user_id': user_id, 'amount': -amount,
+                                     'reason': 'Canceled', 'cancels_id': None,
+                                     'timestamp': max(timestamp, canceled_timestamp)})
+            cancellations.append({'canceled_id': canceled_id, 'cancellation_id': transaction_id})
+            line_rows = [(beverage_id, -count, price) for beverage_id, count, price in canceled_lines]
+            amount = -amount
+        elif kind < cancel_ratio + deposit_ratio or not beverage_ids:
+            user_id = rng.choice(user_ids)
+            amount = rng.randrange(500, 5001, 500)
+            line_rows = []
+            transaction_rows.append({'id': transaction_id, 'user_id': user_id, 'amount': amount,
+                                     'reason': 'Deposit', 'cancels_id': None, 'timestamp': timestamp})
+            cancelable.append((transaction_id, user_id, amount, timestamp, line_rows))
+        else:
+            user_id = rng.choice(user_ids)
+            line_rows = [(beverage_id, -rng.randint(1, 3), prices[beverage_id])
+                         for beverage_id in rng.sample(beverage_ids, rng.randint(1, min(3, len(beverage_ids))))]
+            amount = sum(count * price for _, count, price in line_rows)
+            transaction_rows.append({'id': transaction_id, 'user_id': user_id, 'amount': amount,
+                                     'reason': None, 'cancels_id': None, 'timestamp': timestamp})
+            cancelable.append((transaction_id, user_id, amount, timestamp, line_rows))
+
+        balance_changes[user_id] = balance_changes.get(user_id, 0) + amount
+        for beverage_id, count, price in line_rows:
+            stock_changes[beverage_id] += count
+            beverage_line_rows.append({'transaction_id': transaction_id, 'beverage_id': beverage_id,
+                                       'count': count, 'price': price})
+        lines += len(line_rows)
+
+        if len(transaction_rows) >= batch_size:
+            insert_batch(Transaction, transaction_rows)
+            insert_batch(TransactionBeverage, beverage_line_rows)
+            link_cancellations(cancellations)
+    insert_batch(Transaction, transaction_rows)
+    insert_batch(TransactionBeverage, beverage_line_rows)
+    link_cancellations(cancellations)
+
+    # choose the initial stocks so that they cover the generated consumption
+    initial_stocks = {beverage_id: max(-change, 0) + rng.randint(0, 500)
+                      for beverage_id, change in stock_changes.items()}
+    for beverage_id, initial_stock in initial_stocks.items():
+        stock_changes[beverage_id] += initial_stock
+    User.change_balances(balance_changes)
+    Beverage.change_stocks(stock_changes)
+    if initial_stocks:
+        table = Beverage.__table__
+        DB.session.execute(table.update().where(table.c.id == bindparam('beverage_id'))
+                           .values(stock_offset=bindparam('initial_stock')),
+                           [{'beverage_id': beverage_id, 'initial_stock': initial_stock}
+                            for beverage_id, initial_stock in initial_stocks.items()])
+    BeverageConsumption.rebuild(start_time)
+    reset_sequences(User, Beverage, Transaction)
+    DB.session.commit()
+    APP.logger.info('Seeded %d users, %d beverages and %d transactions.', users, beverages, transactions)
+    return {'users': users, 'beverages': beverages, 'transactions': transactions, 'transaction_beverages': lines}
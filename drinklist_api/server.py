@@ -0,0 +1,153 @@
+"""
+Preforking production server.
+
+The flask serve command loads the app once, binds the listening socket and forks the worker
+processes, which share the memory of the loaded app copy-on-write and accept connections from
+the shared socket. Exited workers are replaced; SIGTERM or SIGINT stop all workers.
+Workers exiting shortly after their start are replaced with an increasing delay, and after
+too many such failures in a row the server stops.
+"""
+
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional, Type
+
+import click
+from flask import Flask
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from . import APP
+from .metrics import observe_worker_exit
+from .wsgi import close_connections
+
+
+class PreforkServer():
+    """
+    Server running the app in a number of forked worker processes.
+
+    The socket is bound on creation, so the port is known before serve() is called.
+    """
+
+    MIN_UPTIME = 5  # Seconds a worker has to run to not count as failed at startup
+    MAX_FAST_FAILURES = 10  # Failures at startup in a row, after which the server stops
+    RESTART_DELAY = 0.1  # Seconds before the restart after the first failure, doubled with every further one
+    MAX_RESTART_DELAY = 10
+
+    # pylint: disable=R0913
+    def __init__(self, app: Flask, host: str, port: int, workers: int, threaded: bool = False,
+                 request_handler: Optional[Type[WSGIRequestHandler]] = None):
+        self.app = app
+        self.workers = workers
+        self.threaded = threaded
+        self.request_handler = request_handler
+        self.socket = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(128)
+        self.host, self.port = self.socket.getsockname()[:2]
+        self._children: Dict[int, int] = {}  # pid -> worker number
+        self._started: Dict[int, float] = {}  # pid -> monotonic start time
+        self._fast_failures = 0
+        self._stopping = False
+
+    def serve(self) -> int:
+        """
+        Fork the workers and replace exited workers until SIGTERM or SIGINT is received.
+
+        Returns the exit status of the server, 1 if it stopped after too many failures at startup.
+        """
+        close_connections()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for number in range(self.workers):
+            self._spawn(number)
+        APP.logger.info('Serving on http://%s:%d with %d workers.', self.host, self.port, self.workers)
+        exit_status = 0
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            number = self._children.pop(pid, None)
+            uptime = time.monotonic() - self._started.pop(pid, 0)
+            observe_worker_exit(pid)
+            if number is None or self._stopping:
+                continue
+            if uptime >= self.MIN_UPTIME:
+                self._fast_failures = 0
+                APP.logger.warning('Worker %d exited with wait status %d, restarting it.', pid, status)
+            else:
+                self._fast_failures += 1
+                if self._fast_failures >= self.MAX_FAST_FAILURES:
+                    APP.logger.error('Worker %d exited with wait status %d after %.1fs, %d failures at startup '
+                                     'in a row. Stopping the server.', pid, status, uptime, self._fast_failures)
+                    self._stop(None, None)
+                    exit_status = 1
+                    continue
+                delay = min(self.RESTART_DELAY * 2 ** (self._fast_failures - 1), self.MAX_RESTART_DELAY)
+                APP.logger.warning('Worker %d exited with wait status %d after %.1fs, restarting it in %.1fs.',
+                                   pid, status, uptime, delay)
+                time.sleep(delay)
+                if self._stopping:
+                    continue
+            self._spawn(number)
+        self.socket.close()
+        return exit_status
+
+    def _stop(self, signum, frame):  # pylint: disable=W0613
+        """
+        Signal handler stopping all workers.
+        """
+        self._stopping = True
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _spawn(self, number: int):
+        """
+        Fork a worker.
+        """
+        pid = os.fork()
+        if pid:
+            self._children[pid] = number
+            self._started[pid] = time.monotonic()
+            return
+        status = 0
+        try:
+            self._run_worker()
+        except SystemExit as error:
+            status = error.code if isinstance(error.code, int) else 0
+        except BaseException:  # pylint: disable=W0703
+            APP.logger.exception('Worker %d crashed.', os.getpid())
+            status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)  # pylint: disable=W0212
+
+    def _run_worker(self):
+        """
+        Serve requests from the shared socket until SIGTERM is received.
+        """
+        # the supervisor stops the workers, also on Ctrl-C in the terminal
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        close_connections()
+        server = make_server(self.host, self.port, self.app, threaded=self.threaded,
+                             request_handler=self.request_handler, fd=self.socket.fileno())
+        server.serve_forever()
+
+
+@APP.cli.command('serve')
+@click.option('--host', default='127.0.0.1', help='The interface to bind to.')
+@click.option('--port', type=int, default=5000, help='The port to bind to.')
+@click.option('--workers', type=click.IntRange(1), default=os.cpu_count() or 1, help='Number of worker processes.')
+@click.option('--threaded', is_flag=True, help='Handle requests of a worker in threads.')
+def serve(host: str, port: int, workers: int, threaded: bool):
+    """Run the production server with preloaded, forked workers."""
+    sys.exit(PreforkServer(APP, host, port, workers, threaded).serve())
@@ -0,0 +1,53 @@
+"""
+WSGI entry point for production servers.
+
+The whole app is set up when this module is imported. Servers which import it once and fork
+their workers afterwards (flask serve, gunicorn --preload) must call close_connections() in the
+preloading process before forking and in every worker after the fork, so that no database or
+LDAP connection is shared between processes.
+
+With gunicorn this module can be loaded as config file for preload_app and the fork and exit
+hooks. Other settings, e.g. the address and the number of workers, still have to be given:
+gunicorn -c python:drinklist_api.wsgi --bind 0.0.0.0:5000 --workers 4 drinklist_api.wsgi:application
+"""
+
+from . import APP, DB
+from .api.authentication import LOGIN_SERVICE
+from .metrics import observe_worker_exit
+
+application = APP
+
+
+def close_connections():
+    """
+    Close all database and LDAP connections of this process.
+    """
+    DB.session.remove()
+    for bind in [None] + list(APP.config.get('SQLALCHEMY_BINDS') or {}):
+        DB.get_engine(APP, bind).dispose()
+    LOGIN_SERVICE.close_connections()
+
+
+# gunicorn settings and server hooks
+preload_app = True
+
+
+def pre_fork(server, worker):  # pylint: disable=W0613
+    """
+    Called by gunicorn in the master process before a worker is forked.
+    """
+    close_connections()
+
+
+def post_fork(server, worker):  # pylint: disable=W0613
+    """
+    Called by gunicorn in a worker after it was forked.
+    """
+    close_connections()
+
+
+def child_exit(server, worker):  # pylint: disable=W0613
+    """
+    Called by gunicorn in the master process after a worker exited.
+    """
+    observe_worker_exit(worker.pid)
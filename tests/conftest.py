@@ -0,0 +1,96 @@
+"""
+Fixtures of the tests.
+
+The app is configured when drinklist_api is imported, so the environment is set up first:
+TestingConfig and a file-backed SQLite database in a temporary directory.
+"""
+
+import os
+import tempfile
+from itertools import count
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='drinklist-tests-'), 'test.db')
+
+os.environ['FLASK_ENV'] = 'test'
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + DB_FILE
+os.environ.pop('CONFIG_FILE', None)
+# the logging configs are relative to the repository root
+os.chdir(ROOT)
+
+# pylint: disable=C0413
+from drinklist_api import APP, DB
+from drinklist_api.db_models.beverage import Beverage
+
+PASSWORD = 'test'
+ADMIN = 'test-admin'
+USERS = ['test-user-{}'.format(i) for i in range(8)]
+
+# the Basic login provider was created with the config on import
+APP.config['BASIC_AUTH_USERS'].update({name: PASSWORD for name in USERS + [ADMIN]})
+APP.config['BASIC_AUTH_ADMIN'].append(ADMIN)
+APP.config['BASIC_AUTH_USER'].extend(USERS)
+
+BEVERAGE_NUMBERS = count()
+
+
+@pytest.fixture(scope='session')
+def app():
+    """
+    The app with the tables created once per test run.
+
+    The login service caches the users of the database, so the tables are not recreated for every test.
+    """
+    with APP.app_context():
+        DB.create_all()
+    yield APP
+    DB.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    """
+    Test client of the app.
+    """
+    return app.test_client()
+
+
+def login(client, name: str) -> dict:
+    """
+    Login with a test account, which creates its user, and return the authorization header.
+    """
+    response = client.post('/auth/login/', json={'username': name, 'password': PASSWORD})
+    assert response.status_code == 200
+    return {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+
+
+@pytest.fixture
+def admin_headers(client):
+    """
+    Authorization header of the admin.
+    """
+    return login(client, ADMIN)
+
+
+@pytest.fixture
+def user_names(client):
+    """
+    Names of the consuming test users, created by their first login.
+    """
+    for name in USERS:
+        login(client, name)
+    return USERS
+
+
+@pytest.fixture
+def beverages(app):
+    """
+    Ids of 20 new beverages with a stock of 1000.
+    """
+    with app.app_context():
+        rows = [Beverage('Beverage {}'.format(next(BEVERAGE_NUMBERS)), 100 + i, 1000) for i in range(20)]
+        DB.session.add_all(rows)
+        DB.session.commit()
+        return [row.id for row in rows]
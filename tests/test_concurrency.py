@@ -0,0 +1,62 @@
+"""
+Concurrent purchases must not lose balance or stock updates.
+"""
+
+from threading import Thread
+
+import pytest
+
+from drinklist_api import APP, DB
+from drinklist_api.db_models.beverage import Beverage
+from drinklist_api.db_models.user import User
+
+THREADS = 8
+PURCHASES_PER_THREAD = 25
+
+
+def balances_and_stocks(user_names, beverage_ids):
+    """
+    Current balances of the users and stocks of the beverages.
+    """
+    with APP.app_context():
+        balances = dict(DB.session.query(User.name, User.balance).filter(User.name.in_(user_names)))
+        stocks = dict(DB.session.query(Beverage.id, Beverage.stock).filter(Beverage.id.in_(beverage_ids)))
+        DB.session.remove()
+    return balances, stocks
+
+
+@pytest.mark.parametrize('row_locking', (False, True))
+def test_concurrent_purchases(client, admin_headers, user_names, beverages, row_locking, monkeypatch):
+    monkeypatch.setitem(APP.config, 'TRANSACTION_ROW_LOCKING', row_locking)
+    basket = beverages[:3]
+    basket_amount = -sum(100 + i for i in range(3))  # the beverages cost 100 + their index
+    balances, stocks = balances_and_stocks(user_names, basket)
+    statuses = []
+
+    def purchase(thread: int):
+        thread_client = APP.test_client()
+        for number in range(PURCHASES_PER_THREAD):
+            # the threads share the users, so concurrent requests update the same rows
+            user = user_names[(thread + number) % len(user_names)]
+            response = thread_client.post('/users/{}/transactions/'.format(user), headers=admin_headers, json={
+                'beverages': [{'beverage': {'id': beverage_id}, 'count': -1} for beverage_id in basket],
+                'amount': 0,
+                'reason': 'stress',
+            })
+            statuses.append(response.status_code)
+
+    threads = [Thread(target=purchase, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [201] * THREADS * PURCHASES_PER_THREAD
+    purchases = {name: 0 for name in user_names}
+    for thread in range(THREADS):
+        for number in range(PURCHASES_PER_THREAD):
+            purchases[user_names[(thread + number) % len(user_names)]] += 1
+    new_balances, new_stocks = balances_and_stocks(user_names, basket)
+    assert new_balances == {name: balances[name] + purchases[name] * basket_amount for name in user_names}
+    assert new_stocks == {beverage_id: stocks[beverage_id] - THREADS * PURCHASES_PER_THREAD
+                          for beverage_id in basket}
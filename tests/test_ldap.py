@@ -0,0 +1,149 @@
+"""
+The LDAP login provider against the in-memory mock server of ldap3.
+"""
+
+from time import monotonic
+
+import pytest
+from ldap3 import Connection, MOCK_SYNC
+from ldap3.core.exceptions import LDAPCommunicationError
+
+from drinklist_api import APP
+from drinklist_api.auth_providers import ldap_connection_pool
+from drinklist_api.auth_providers.ldap_auth_provider import LDAPAuthProvider
+
+SERVICE_DN = 'cn=service,dc=example'
+
+CONFIG = {
+    'LDAP_URI': 'mock',
+    'LDAP_CLIENT_STRATEGY': MOCK_SYNC,
+    'LDAP_BIND_DN': SERVICE_DN,
+    'LDAP_BIND_PASSWORD': 'service',
+    'LDAP_USER_SEARCH_BASE': 'ou=users,dc=example',
+    'LDAP_GROUP_SEARCH_BASE': 'ou=groups,dc=example',
+    'LDAP_USER_RDN': 'uid',
+    'LDAP_USER_UID_FIELD': 'uid',
+    'LDAP_GROUP_MEMBERSHIP_FIELD': 'memberUid',
+    'LDAP_CONSUMER_FILTER': '(objectClass=person)',
+    'LDAP_KIOSK_USER_FILTER': '(employeeType=kiosk)',
+    'LDAP_ADMIN_FILTER': '',
+    'LDAP_CONSUMER_GROUP_FILTER': '(cn=drinkers)',
+    'LDAP_KIOSK_USER_GROUP_FILTER': '(cn=drinkers)',
+    'LDAP_ADMIN_GROUP_FILTER': '(cn=admins)',
+    'LDAP_POOL_SIZE': 2,
+    'LDAP_POOL_IDLE_TIMEOUT': 60,
+    'LDAP_POOL_HEALTH_CHECK': False,
+}
+
+ENTRIES = [
+    (SERVICE_DN, {'userPassword': 'service', 'objectClass': 'person'}),
+    ('uid=alice,ou=users,dc=example', {'uid': 'alice', 'userPassword': 'alice', 'objectClass': 'person'}),
+    ('uid=bob,ou=users,dc=example', {'uid': 'bob', 'userPassword': 'bob', 'objectClass': 'person'}),
+    ('uid=kiosk,ou=users,dc=example', {'uid': 'kiosk', 'userPassword': 'kiosk', 'employeeType': 'kiosk',
+                                       'objectClass': 'person'}),
+    ('cn=drinkers,ou=groups,dc=example', {'cn': 'drinkers', 'memberUid': ['alice', 'bob', 'kiosk'],
+                                          'objectClass': 'posixGroup'}),
+    ('cn=admins,ou=groups,dc=example', {'cn': 'admins', 'memberUid': ['alice'], 'objectClass': 'posixGroup'}),
+]
+
+
+def create_provider(monkeypatch, **config) -> LDAPAuthProvider:
+    """
+    Create a LDAP provider connected to a new mock server with the ENTRIES.
+    """
+    for key, value in dict(CONFIG, **config).items():
+        monkeypatch.setitem(APP.config, key, value)
+    provider = LDAPAuthProvider()
+    provider.init()
+    connection = Connection(provider.server, client_strategy=MOCK_SYNC)
+    for dn, attributes in ENTRIES:
+        connection.strategy.add_entry(dn, attributes)
+    return provider
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    return create_provider(monkeypatch)
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """
+    Search bases of all LDAP searches, in order.
+    """
+    bases = []
+    search = Connection.search
+
+    def counting_search(self, search_base, *args, **kwargs):
+        bases.append(search_base)
+        return search(self, search_base, *args, **kwargs)
+
+    monkeypatch.setattr(Connection, 'search', counting_search)
+    return bases
+
+
+@pytest.fixture
+def opened(provider):
+    """
+    Number of service connections the pool of the provider opened.
+    """
+    counter = {'connections': 0}
+    factory = provider.pool.connection_factory
+
+    def counting_factory():
+        counter['connections'] += 1
+        return factory()
+
+    provider.pool.connection_factory = counting_factory
+    return counter
+
+
+def login(provider: LDAPAuthProvider, user: str, password: str) -> bool:
+    """
+    Login without cached roles, so the roles are searched again.
+    """
+    provider.flush_user(user)
+    return provider.valid_user(user) and provider.valid_password(user, password)
+
+
+def test_wrong_password(provider, searches):
+    assert not login(provider, 'alice', 'wrong')
+    assert not login(provider, 'nobody', 'nobody')
+    assert searches == []
+
+
+@pytest.mark.parametrize('user, admin, kiosk_user', [('alice', True, False), ('bob', False, False),
+                                                     ('kiosk', False, True)])
+def test_roles_with_one_user_and_one_group_search(provider, searches, user, admin, kiosk_user):
+    assert login(provider, user, user)
+    assert searches == [CONFIG['LDAP_USER_SEARCH_BASE'], CONFIG['LDAP_GROUP_SEARCH_BASE']]
+    assert provider.is_consuming_user(user)
+    assert provider.is_admin(user) == admin
+    assert provider.is_kiosk_user(user) == kiosk_user
+
+
+def test_pooled_connection_reused(provider, opened):
+    for user in ('alice', 'bob', 'alice'):
+        assert login(provider, user, user)
+    assert opened['connections'] == 1
+
+
+def test_idle_connection_replaced(provider, opened, monkeypatch):
+    assert login(provider, 'alice', 'alice')
+    start = monotonic()
+    monkeypatch.setattr(ldap_connection_pool, 'monotonic', lambda: start + CONFIG['LDAP_POOL_IDLE_TIMEOUT'] + 1)
+    assert login(provider, 'alice', 'alice')
+    assert opened['connections'] == 2
+
+
+def test_unhealthy_connection_replaced(monkeypatch):
+    provider = create_provider(monkeypatch, LDAP_POOL_HEALTH_CHECK=True)
+    assert login(provider, 'alice', 'alice')
+    broken = provider.pool._idle[-1][0]  # pylint: disable=W0212
+
+    def fail(*args, **kwargs):
+        raise LDAPCommunicationError('connection lost')
+
+    monkeypatch.setattr(broken, 'search', fail)
+    assert login(provider, 'alice', 'alice')
+    assert provider.pool._idle[-1][0] is not broken  # pylint: disable=W0212
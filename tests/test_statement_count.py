@@ -0,0 +1,63 @@
+"""
+The number of SQL statements of creating and canceling a transaction must not depend on its size.
+"""
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BASKET_SIZES = (1, 5, 20)
+
+# statements of one request for every basket size, raise them only together with a reason
+CREATE_STATEMENTS = 11
+CANCEL_STATEMENTS = 12
+
+
+class StatementCounter():
+    """
+    Context manager counting the SQL statements executed by all engines.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def _count(self, *args):  # pylint: disable=W0613
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._count)
+
+
+def basket(beverages, size: int):
+    """
+    Beverages of a purchase of one of each of the first size beverages.
+    """
+    return [{'beverage': {'id': beverage_id}, 'count': -1} for beverage_id in beverages[:size]]
+
+
+@pytest.mark.parametrize('size', BASKET_SIZES)
+def test_create_statements(client, admin_headers, user_names, beverages, size):
+    with StatementCounter() as counter:
+        response = client.post('/users/{}/transactions/'.format(user_names[0]), headers=admin_headers,
+                               json={'beverages': basket(beverages, size), 'amount': 0, 'reason': 'test'})
+    assert response.status_code == 201
+    assert len(response.get_json()['beverages']) == size
+    assert counter.count == CREATE_STATEMENTS
+
+
+@pytest.mark.parametrize('size', BASKET_SIZES)
+def test_cancel_statements(client, admin_headers, user_names, beverages, size):
+    response = client.post('/users/{}/transactions/'.format(user_names[0]), headers=admin_headers,
+                           json={'beverages': basket(beverages, size), 'amount': 0, 'reason': 'test'})
+    transaction_id = response.get_json()['id']
+    with StatementCounter() as counter:
+        response = client.delete('/users/{}/transactions/{}/'.format(user_names[0], transaction_id),
+                                 headers=admin_headers, json={'reason': 'cancel'})
+    assert response.status_code == 201
+    assert len(response.get_json()['beverages']) == size
+    assert counter.count == CANCEL_STATEMENTS